@@ -5,6 +5,7 @@ import sys
 import csv
 import re
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
@@ -12,6 +13,9 @@ import geopandas as gpd
 
 import usaddress
 
+from parse_cache import ParseCache, normalize_address
+from instrumentation import metrics, add_metrics_args, start_metrics
+
 """USPS Publication 28 Address Standard"""
 Pub28_usaddress_template = {
     "Recipient": "recipient",
@@ -103,13 +107,36 @@ us_state_to_abbrev = {
     "U.S. Virgin Islands": "VI",
 }
 
-state_full_pattern = r"/AL|Alabama|AK|Alaska|AZ|Arizona|AR|Arkansas|CA|California|CO|Colorado|CT|Connecticut|DE|Delaware|FL|Florida|GA|Georgia|HI|Hawaii|ID|Idaho|IL|Illinois|IN|Indiana|IA|Iowa|KS|Kansas|KY|Kentucky|LA|Louisiana|ME|Maine|MD|Maryland|MA|Massachusetts|MI|Michigan|MN|Minnesota|MS|Mississippi|MO|Missouri|MT|Montana|NE|Nebraska|NV|Nevada|NH|New Hampshire|NJ|New Jersey|NM|New Mexico|NY|New York|NC|North Carolina|ND|North Dakota|OH|Ohio|OK|Oklahoma|OR|Oregon|PA|Pennsylvania|RI|Rhode Island|SC|South Carolina|SD|South Dakota|TN|Tennessee|TX|Texas|UT|Utah|VT|Vermont|VA|Virginia|WA|Washington|WV|West Virginia|WI|Wisconsin|WY|Wyoming/"
-state_abbr_pattern = re.compile(r"\b(AZ|CA|...|NJ|N\.J\.|NM|N\.M\.|...)\b")
+"""Full US state and territory names, case-insensitive, longest first"""
+state_full_pattern = "(?i:{})".format(
+    "|".join(
+        r"\s+".join(re.escape(word) for word in name.split())
+        for name in sorted(us_state_to_abbrev, key=len, reverse=True)
+    )
+)
+
+"""US state and territory abbreviations, plain (NJ) or dotted (N.J.)"""
+state_abbr_pattern = "|".join(
+    rf"{abbr[0]}\.\s?{abbr[1]}\.?|{abbr}" for abbr in us_state_to_abbrev.values()
+)
+
 state_abbr_case = r"^([Aa][LKSZRAEPlkszraep]|[Cc][AOTaot]|[Dd][ECec]|[Ff][LMlm]|[Gg][AUau]|[Hh][Ii]|[Ii][ADLNadln]|[Kk][SYsy]|[Ll][Aa]|[Mm][ADEHINOPSTadehinopst]|[Nn][CDEHJMVYcdehjmvy]|[Oo][HKRhkr]|[Pp][ARWarw]|[Rr][Ii]|[Ss][CDcd]|[Tt][NXnx]|[Uu][Tt]|[Vv][AITait]|[Ww][AIVYaivy])$"
 zip_code_pattern = r"[0-9]{5}(?:-[0-9]{4})?"
 
-os.chdir("..")
-abs_path = os.getcwd()
+"""Unit designators that start address line 2"""
+unit_pattern = r"APT|SUITE|UNIT"
+
+"""OMOP column : usaddress tag of Pub28_usaddress_template"""
+OMOP_tag_columns = {
+    "address_1": "address1",
+    "address_2": "address2",
+    "city": "city",
+    "state": "state",
+    "zip": "zip_code",
+}
+
+"""Number of unique address strings tagged per worker task"""
+tag_chunk_size = 10000
 
 
 def create_dir(save_dir):
@@ -131,6 +158,7 @@ def OMOP_Dataset(address_df, address_col):
     Parameters
     ----------
     address_df (DataFrame): initial address DataFrame
+    address_col (str): column name of full address string
     """
     OMOP_df = pd.DataFrame(
         columns=[
@@ -147,62 +175,192 @@ def OMOP_Dataset(address_df, address_col):
         ]
     )
 
-    OMOP_df["location_source_value"] = address_df.address_col
+    OMOP_df["location_source_value"] = address_df[address_col]
     OMOP_df["location_id"] = OMOP_df.index + 1
 
     # OMOP_location['Location_id'] = OMOP_location.re+1
-    OMOP_df.latitude = address_df.source_lat
-    OMOP_df.longitude = address_df.source_lon
+    if "source_lat" in address_df.columns and "source_lon" in address_df.columns:
+        OMOP_df.latitude = address_df.source_lat
+        OMOP_df.longitude = address_df.source_lon
 
     return OMOP_df
 
 
-def usaddress_parse(df, tag_template=Pub28_usaddress_template):
+def tag_addresses(addresses, tag_template=Pub28_usaddress_template):
     """
-    df (DataFrame): must contain `location_source_value`
+    Tag address strings with usaddress
 
     Parameters
     ----------
-    df (DataFrame): OMOP_df for address parsing
+    addresses (list): full address strings
+    tag_template (dict): usaddress label : component
+
+    Returns
+    -------
+    results (list): one (tags, address_type, parse_error) tuple per address,
+        with tags None and the reason in parse_error if tagging failed
     """
-    repo = pd.DataFrame()
-    for idx, each in df.loc[:, ["location_source_value"]].drop_duplicates().iterrows():
-        # try Pub28 parsing
+    results = []
+    for address in addresses:
         try:
-            obj = usaddress.tag(each.location_source_value, tag_mapping=tag_template)
+            tags, address_type = usaddress.tag(address, tag_mapping=tag_template)
+            results.append((dict(tags), address_type, None))
+        except usaddress.RepeatedLabelError as e:
+            # the label is the last constructor argument of RepeatedLabelError
+            results.append((None, None, f"repeated label {e.args[-1]}"))
+        except Exception as e:
+            results.append((None, None, f"{type(e).__name__}: {e}"))
 
-            # staging
-            tmp = pd.DataFrame(obj[0], columns=obj[0].keys(), index=[idx])
-            tmp["Address_type"] = obj[1]
+    return results
 
-            # development
-            df.loc[idx, "address_1"] = tmp["address1"].values[0]
-            df.loc[idx, "city"] = tmp["city"].values[0]
-            df.loc[idx, "state"] = tmp["state"].values[0]
-            df.loc[idx, "zip"] = tmp["zip_code"].values[0]
-            df.loc[idx, "address_type"] = tmp["Address_type"].values[0]
 
-            address_2 = tmp["address2"].values[0]
-            if len(address_2) >= 3:
-                df.loc[ind, "address_2"] = address_2
-            else:
-                df.loc[ind, "address_2"] = np.NaN
+def tag_unique(addresses, tag_template=Pub28_usaddress_template, workers=1):
+    """
+    Tag address strings in chunks of tag_chunk_size, spread over worker processes
 
-            repo = repo.append(tmp)
+    Parameters
+    ----------
+    addresses (list): unique full address strings
+    tag_template (dict): usaddress label : component
+    workers (int): number of worker processes, default 1 tags in this process
 
-        except:
-            pass
+    Returns
+    -------
+    results (list): one (tags, address_type, parse_error) tuple per address
+    """
+    chunks = [
+        addresses[start : start + tag_chunk_size]
+        for start in range(0, len(addresses), tag_chunk_size)
+    ]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(tag_addresses, chunks, [tag_template] * len(chunks))
+            return [result for chunk in results for result in chunk]
+
+    return [result for chunk in chunks for result in tag_addresses(chunk, tag_template)]
+
+
+def usaddress_parse(df, tag_template=Pub28_usaddress_template, workers=1, cache=None):
+    """
+    Parse `location_source_value` to OMOP components with usaddress. Each
+        unique address string is tagged once, in chunks spread over worker
+        processes, and the components are written back to every row.
+
+    Parameters
+    ----------
+    df (DataFrame): OMOP_df for address parsing, must contain `location_source_value`
+    tag_template (dict): usaddress label : component
+    workers (int): number of worker processes, default 1 tags in this process
+    cache (ParseCache): parse results of previous runs, default None tags every address
+
+    Returns
+    -------
+    df (DataFrame): with the OMOP address columns, `address_type` and
+        `parse_error`, the reason tagging failed or None
+    """
+    codes, addresses = pd.factorize(df["location_source_value"])
+    addresses = list(addresses)
+
+    if cache is None:
+        results = tag_unique(addresses, tag_template, workers)
+    else:
+        # only addresses missing from the cache are tagged
+        keys = [normalize_address(address) for address in addresses]
+        hits = cache.get_many(keys)
+        misses = list(dict.fromkeys(key for key in keys if key not in hits))
+        first = {}
+        for address, key in zip(addresses, keys):
+            first.setdefault(key, address)
+        tagged = dict(zip(misses, tag_unique([first[key] for key in misses], tag_template, workers)))
+        cache.put_many(tagged)
+        results = [hits[key] if key in hits else tagged[key] for key in keys]
+
+    # missing addresses are coded -1 and take the extra last row
+    results.append((None, None, "missing address"))
+    codes = np.where(codes < 0, len(results) - 1, codes)
+
+    parsed = {
+        col: np.array([tags.get(tag) if tags else None for tags, _, _ in results], dtype=object)
+        for col, tag in OMOP_tag_columns.items()
+    }
+    parsed["address_type"] = np.array([address_type for _, address_type, _ in results], dtype=object)
+    parsed["parse_error"] = np.array([error for _, _, error in results], dtype=object)
+
+    # a line 2 shorter than 3 characters is a tagging artifact
+    address_2 = pd.Series(parsed["address_2"])
+    parsed["address_2"] = address_2.where(address_2.str.len() >= 3).to_numpy()
+
+    for col, values in parsed.items():
+        df[col] = values[codes]
 
     return df
 
 
+def canonical_state(text):
+    """
+    Canonical form of a state name or abbreviation: upper case, no
+        punctuation and single spaces, e.g., 'N.J.' -> 'NJ'
+    """
+    return " ".join(re.sub(r"[^A-Z0-9\s]", "", str(text).upper()).split())
+
+
+def state_table(wordDict=us_state_to_abbrev):
+    """
+    Exact-match lookup of canonical names and values of wordDict
+
+    Parameters
+    ----------
+    wordDict (dict): name : replacement, e.g., us_state_to_abbrev
+
+    Returns
+    -------
+    lookup (dict): canonical name or replacement : replacement
+    """
+    lookup = {}
+    for key, value in wordDict.items():
+        for text in (value, key, " ".join(value) if len(value) == 2 else value):
+            lookup[canonical_state(text)] = value
+
+    return lookup
+
+
+"""Canonical US state and territory names and abbreviations : abbreviation"""
+state_lookup = state_table(us_state_to_abbrev)
+
+
+def normalize_state(values, wordDict=us_state_to_abbrev):
+    """
+    Replace whole state names, abbreviations and dotted abbreviations
+        (e.g., 'West Virginia', 'wa', 'N.J.') by the value of wordDict.
+        Each unique value is looked up once; unmatched values are kept.
+
+    Parameters
+    ----------
+    values (Series): state names
+    wordDict (dict): name : replacement, default us_state_to_abbrev
+
+    Returns
+    -------
+    values (Series): replaced state names
+    """
+    lookup = state_lookup if wordDict is us_state_to_abbrev else state_table(wordDict)
+
+    values = values.astype(str).str.strip()
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    canonical = pd.Index(uniques).str.upper().str.replace(r"[^A-Z0-9\s]", "", regex=True).str.split().str.join(" ")
+    replaced = np.where(canonical.isin(list(lookup)), canonical.map(lookup), uniques)
+
+    return pd.Series(replaced[codes], index=values.index, name=values.name)
+
+
 def multipleReplace(text, wordDict=us_state_to_abbrev):
     """
-    Replace string value from dictionary
+    Replace a whole state name by its value in wordDict, the scalar form of
+        normalize_state
     """
-    for key in wordDict:
-        text = text.replace(key, wordDict[key])
-    return text
+    lookup = state_lookup if wordDict is us_state_to_abbrev else state_table(wordDict)
+    return lookup.get(canonical_state(text), text)
 
 
 def OMOP_clean(df):
@@ -210,340 +368,255 @@ def OMOP_clean(df):
     Replace full state names with state abbreviations and
         only capitalize first string character
     """
-    df["state_abbr"] = df.state.apply(lambda x: multipleReplace(str(x).strip()))
+    df["state_abbr"] = normalize_state(df.state)
 
     # clean string values where only first character is capitalized
-    df["address_1"] = df.address_1.apply(lambda x: str(x).strip().title())
-    df["address_2"] = df.address_2.apply(
-        lambda x: str(x).strip().title() if not np.NaN else x
-    )
-    df["city"] = df.city.apply(lambda x: str(x).strip().title())
+    # missing components stay missing instead of becoming 'Nan'
+    for col in ["address_1", "address_2", "city"]:
+        df[col] = df[col].apply(lambda x: str(x).strip().title() if pd.notna(x) else x)
 
     return df
 
 
+def address_pattern(
+    state_full_pattern=state_full_pattern,
+    state_abbr_pattern=state_abbr_pattern,
+    zip_code_pattern=zip_code_pattern,
+    unit_pattern=unit_pattern,
+):
+    """
+    Compile one pattern for 'address_1 [address_2], city[, ...], state zip'
+        addresses. address_2 starts at the first unit designator of the
+        street component; state and ZIP are searched in the last component.
+
+    Parameters
+    ----------
+    state_full_pattern (str): full state names, without capturing groups
+    state_abbr_pattern (str): state abbreviations, without capturing groups
+    zip_code_pattern (str): ZIP codes, without capturing groups
+    unit_pattern (str): unit designators, without capturing groups
+
+    Returns
+    -------
+    pattern (Pattern): with address_1, address_2, city, state and zip groups
+    """
+    # states and unit designators must not be part of a longer word
+    state = rf"(?<![A-Za-z])(?:{state_abbr_pattern}|{state_full_pattern})(?![A-Za-z])"
+    unit = rf"(?i:{unit_pattern})(?![A-Za-z])"
+
+    return re.compile(
+        rf"^\s*(?P<address_1>[^,]*?)(?:\s+(?P<address_2>{unit}[^,]*?))?\s*,"
+        rf"\s*(?P<city>[^,]*?)\s*,(?:[^,]*,)*"
+        rf"(?:[^,]*?(?P<state>{state}))?"
+        rf"(?:[^,]*?(?P<zip>(?<![0-9]){zip_code_pattern}(?![0-9])))?"
+        rf"[^,]*$"
+    )
+
+
 def custom_parser(
     df,
     address_col,
-    state_full_pattern,
-    state_abbr_pattern,
-    zip_code_pattern=r"[0-9]{5}(?:-[0-9]{4})?",
+    state_full_pattern=state_full_pattern,
+    state_abbr_pattern=state_abbr_pattern,
+    zip_code_pattern=zip_code_pattern,
 ):
     """
-    Parse full address string to OMOP components by Regex search
+    Parse full address string to OMOP components by Regex search, in one
+        pass over the column
 
     Parameters
     ----------
     df (DataFrame): Pandas DataFrame of failed addresses
+    address_col (str): column name of full address string
+    state_full_pattern (str): full state names
+    state_abbr_pattern (str): state abbreviations
+    zip_code_pattern (str): ZIP codes
 
     Returns
     -------
-    parse_df (DataFrame): DataFrame with parsed OMOP address components
-    """
-    tmp = []
-    for i, row in df.iterrows():
-        addr_components = row[address_col].split(",")
-
-        # parse address if no RegEx match for 'APT'
-        if len(re.findall(r"APT", row[address_col], flags=re.IGNORECASE)) == 0:
-            state_zip = addr_components[2].split(" ")
-            if (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-            ):
-                row["address_1"] = addr_components[0]
-                row["address_2"] = np.NaN
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                row["address_1"] = addr_components[0]
-                row["address_2"] = np.NaN
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-                and len(re.findall(state_full_pattern, addr_components[-1].title())) > 0
-            ):
-                row["address_1"] = addr_components[0]
-                row["address_2"] = np.NaN
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                row["address_1"] = addr_components[0]
-                row["address_2"] = np.NaN
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-        # # parse address if RegEx match for 'APT' to address_1 & address_2
-        elif len(re.findall(r"APT", row[address_col], flags=re.IGNORECASE)) > 0:
-            if (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-            ):
-                base_address = addr_components[0]
-                apt_string = re.findall(r"APT", row[address_col], flags=re.IGNORECASE)[
-                    0
-                ]
-                row["address_1"] = base_address.partition(apt_string)[0]
-                row["address_2"] = (
-                    base_address.partition(apt_string)[1]
-                    + base_address.partition(apt_string)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                base_address = addr_components[0]
-                apt_string = re.findall(r"APT", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(apt_string)[0]
-                row["address_2"] = (
-                    base_address.partition(apt_string)[1]
-                    + base_address.partition(apt_string)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-                and len(re.findall(state_full_pattern, addr_components[-1].title())) > 0
-            ):
-                base_address = addr_components[0]
-                apt_string = re.findall(r"APT", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(apt_string)[0]
-                row["address_2"] = (
-                    base_address.partition(apt_string)[1]
-                    + base_address.partition(apt_string)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                base_address = addr_components[0]
-                apt_string = re.findall(r"APT", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(apt_string)[0]
-                row["address_2"] = (
-                    base_address.partition(apt_string)[1]
-                    + base_address.partition(apt_string)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-        # # parse address if RegEx match for 'Suite' to to address_1 & address_2
-        elif len(re.findall(r"SUITE", row[address_col], flags=re.IGNORECASE)) > 0:
-            if (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-            ):
-                base_address = addr_components[0]
-                suite_str = re.findall(r"SUITE", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(suite_str)[0]
-                row["address_2"] = (
-                    base_address.partition(suite_str)[1]
-                    + base_address.partition(suite_str)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) > 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                base_address = addr_components[0]
-                suite_str = re.findall(r"SUITE", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(suite_str)[0]
-                row["address_2"] = (
-                    base_address.partition(suite_str)[1]
-                    + base_address.partition(suite_str)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(state_abbr_pattern, addr_components[-1])[0]
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) > 0
-                and len(re.findall(state_full_pattern, addr_components[-1].title())) > 0
-            ):
-                base_address = addr_components[0]
-                suite_str = re.findall(r"SUITE", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(suite_str)[0]
-                row["address_2"] = (
-                    base_address.partition(suite_str)[1]
-                    + base_address.partition(suite_str)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )[0]
-                row["zip"] = re.findall(zip_code_pattern, addr_components[-1])[0]
-
-                tmp.append(row)
-
-            elif (
-                len(re.findall(state_abbr_pattern, addr_components[-1])) == 0
-                and len(re.findall(zip_code_pattern, addr_components[-1])) == 0
-            ):
-                base_address = addr_components[0]
-                suite_str = re.findall(r"SUITE", base_address, flags=re.IGNORECASE)[0]
-                row["address_1"] = base_address.partition(suite_str)[0]
-                row["address_2"] = (
-                    base_address.partition(suite_str)[1]
-                    + base_address.partition(suite_str)[2]
-                )
-                row["city"] = addr_components[1]
-                row["state"] = re.findall(
-                    state_full_pattern, addr_components[-1].title()
-                )
-                row["zip"] = np.NaN
-
-                tmp.append(row)
-
-    return pd.DataFrame(tmp)
-
-
-def custom_flag(x):
-    """
-    Post-hoc data quality check of parsed addresses
-    """
-    # check if PO box address
-    if (
-        "PO" in str(x.address_1)
-        or "PO" in str(x.address_2)
-        or "P.O" in str(x.address_1)
-        or "P.O" in str(x.address_2)
-        or "P O" in str(x.address_1)
-        or "P O" in str(x.address_2)
-        or "PSC" in str(x.address_1)
-        or "PSC" in str(x.address_2)
-        or "PNB" in str(x.address_1)
-        or "PNB" in str(x.address_2)
-        or "PMB" in str(x.address_1)
-        or "PMB" in str(x.address_2)
-    ):
-        return "FAILED DUE TO PO BOX ADDRESS"
-    # check if address_2 and address_1 are flipped
-    elif re.match("APT", x.address_1, re.IGNORECASE) or re.match(
-        "SUITE", x.address_1, re.IGNORECASE
-    ):
-        return "FAILED DUE TO STREET ADDRESS IN LINE_1 IS FLIPPED WITH LINE_2"
-    # check if street address starts with a non-digit character
-    elif not x.address_1[0].isdigit():
-        return "FAILED DUE TO STREET ADDRESS STARTS WITH LETTER"
-    # check address_1 only contains alphanumeric characters (spaces are ok)
-    elif any(not c.isalnum() and not c.isspace() for c in x.address_1):
-        return "FAILED DUE TO PRESENCE OF SPECIAL CHARACTERS"
-    # check if parsed 'state' component matches a US state or territory abbreviation
-    elif len(x.state_abbr) > 2:
-        return "FAILED DUE TO INCORRECT STATE FORMAT"
-    # check if any of the required address components did not parse from the full address
-    elif x[["address_1", "city", "state", "zip"]].isnull().any():
-        return "FAILED DUE TO INCOMPLETE PARSING"
-    else:
-        return "SUCCESSFUL ADDRESS"
+    parse_df (DataFrame): DataFrame with parsed OMOP address components,
+        NaN where a component was not found
+    """
+    pattern = address_pattern(state_full_pattern, state_abbr_pattern, zip_code_pattern)
+    parsed = df[address_col].astype(str).str.extract(pattern)
+
+    parse_df = df.copy()
+    for col in ["address_1", "address_2", "city", "state", "zip"]:
+        parse_df[col] = parsed[col].where(parsed[col] != "")
+
+    return parse_df
+
+
+def po_box_rule(df):
+    """
+    PO box, PSC, PNB or PMB in address line 1 or 2
+    """
+    pattern = r"PO|P\.O|P O|PSC|PNB|PMB"
+    return df.address_1.astype(str).str.contains(pattern, na=False) | df.address_2.astype(str).str.contains(
+        pattern, na=False
+    )
+
+
+def flipped_rule(df):
+    """
+    Address line 1 starts with APT or SUITE, i.e., is flipped with line 2
+    """
+    return df.address_1.astype(str).str.match(r"(?i:APT|SUITE)", na=False)
+
+
+def leading_letter_rule(df):
+    """
+    Street address does not start with a digit
+    """
+    return df.address_1.notna() & ~df.address_1.astype(str).str.match(r"\d", na=False)
+
+
+def special_characters_rule(df):
+    """
+    Street address contains characters other than letters, digits and spaces
+    """
+    return df.address_1.astype(str).str.contains(r"[^\w\s]|_", na=False)
+
+
+def state_format_rule(df):
+    """
+    Parsed state is not a US state or territory abbreviation
+    """
+    return df.state_abbr.isna() | (df.state_abbr.astype(str).str.len() > 2)
+
+
+def incomplete_rule(df):
+    """
+    A required address component did not parse from the full address
+    """
+    return df[["address_1", "city", "state", "zip"]].isna().any(axis=1)
+
+
+"""Data quality rules in priority order: (name, flag, rule). Rule i sets bit i of `flag_bits`."""
+flag_rules = [
+    ("po_box", "FAILED DUE TO PO BOX ADDRESS", po_box_rule),
+    ("flipped", "FAILED DUE TO STREET ADDRESS IN LINE_1 IS FLIPPED WITH LINE_2", flipped_rule),
+    ("leading_letter", "FAILED DUE TO STREET ADDRESS STARTS WITH LETTER", leading_letter_rule),
+    ("special_characters", "FAILED DUE TO PRESENCE OF SPECIAL CHARACTERS", special_characters_rule),
+    ("state_format", "FAILED DUE TO INCORRECT STATE FORMAT", state_format_rule),
+    ("incomplete", "FAILED DUE TO INCOMPLETE PARSING", incomplete_rule),
+]
+
+
+def custom_flag(df, rules=flag_rules):
+    """
+    Post-hoc data quality check of parsed addresses. Every rule is a
+        boolean mask over the columns; each address gets the flag of the
+        first rule it fails, and a bitmask of all rules it fails.
+
+    Parameters
+    ----------
+    df (DataFrame): parsed addresses with address_1, address_2, city, state,
+        state_abbr and zip
+    rules (list): (name, flag, rule) in priority order, default flag_rules
+
+    Returns
+    -------
+    flag (Series): flag of the first failed rule, or 'SUCCESSFUL ADDRESS'
+    flag_bits (Series): bit i set if rule i failed
+    rule_counts (DataFrame): addresses failing each rule ('failed') and
+        flagged by it ('flagged')
+    """
+    masks = [rule(df).to_numpy(dtype=bool) for _, _, rule in rules]
+    flag = np.select(masks, [message for _, message, _ in rules], default="SUCCESSFUL ADDRESS")
+
+    flag_bits = np.zeros(len(df), dtype=np.int64)
+    for bit, mask in enumerate(masks):
+        flag_bits |= mask.astype(np.int64) << bit
+
+    rule_counts = pd.DataFrame(
+        {
+            "rule": [name for name, _, _ in rules],
+            "flag": [message for _, message, _ in rules],
+            "failed": [int(mask.sum()) for mask in masks],
+            "flagged": [int((flag == message).sum()) for _, message, _ in rules],
+        }
+    )
+
+    return (
+        pd.Series(flag, index=df.index, name="flag"),
+        pd.Series(flag_bits, index=df.index, name="flag_bits"),
+        rule_counts,
+    )
 
 
 def main():
     parser = argparse.ArgumentParser(description="Parse addresses to OMOP components")
 
     # args
-    parser.add_argument("address_dir", required=True, help="path of address file (csv)")
+    parser.add_argument("--address_dir", required=True, help="path of address file (csv)")
     parser.add_argument(
-        "address_col", required=True, help="column name of full address string"
+        "--address_col", required=True, help="column name of full address string"
     )
     parser.add_argument(
-        "output_dir", required=True, help="path to save parsed address file"
+        "--output_dir", required=True, help="path to save parsed address file"
     )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of worker processes tagging addresses with usaddress"
+    )
+    parser.add_argument(
+        "--parse_cache", default=None,
+        help="path of a SQLite file caching parse results for later runs"
+    )
+    add_metrics_args(parser)
 
     args = parser.parse_args()
+    start_metrics(parser, args)
 
-    address_df = pd.read_csv(args.address_dir)
-    address_drop = address_df.drop_duplicates(subset=args.address_col)
+    with metrics.stage("read_csv") as m:
+        address_df = pd.read_csv(args.address_dir)
+        address_drop = address_df.drop_duplicates(subset=args.address_col)
+        m["rows_out"] = len(address_drop)
 
     OMOP_df = OMOP_Dataset(address_drop, address_col=args.address_col)
 
     # perform parsing with usaddress library
-    OMOP_address = usaddress_parse(OMOP_df)
-    OMOP_address = OMOP_clean(OMOP_address)
+    cache = ParseCache(args.parse_cache, Pub28_usaddress_template) if args.parse_cache else None
+    with metrics.stage("usaddress_parse", rows_in=len(OMOP_df)):
+        OMOP_address = usaddress_parse(OMOP_df, workers=args.workers, cache=cache)
+    if cache is not None:
+        print(cache.report())
+        cache.close()
+    with metrics.stage("OMOP_clean", rows_in=len(OMOP_address)):
+        OMOP_address = OMOP_clean(OMOP_address)
 
     # filter failed address parsing
     OMOP_address["state_abbr"] = OMOP_address["state_abbr"].astype(str)
     OMOP_state_failed = OMOP_address.loc[OMOP_address.state_abbr.str.len() > 2]
 
-    failed_address_parsed = custom_parser(
-        df=OMOP_state_failed,
-        address_col=args.address_col,
-        state_full_pattern=state_full_pattern,
-        state_abbr_pattern=state_abbr_pattern,
-    )
+    with metrics.stage("custom_parser", rows_in=len(OMOP_state_failed)) as m:
+        failed_address_parsed = custom_parser(
+            df=OMOP_state_failed,
+            address_col="location_source_value",
+            state_full_pattern=state_full_pattern,
+            state_abbr_pattern=state_abbr_pattern,
+        )
+        m["rows_out"] = len(failed_address_parsed)
 
     # replace full state names for failed_address_parsed
-    failed_address_parsed["state_abbr"] = failed_address_parsed.state.apply(
-        lambda x: multipleReplace(str(x).strip(), us_state_to_abbrev)
-    )
+    failed_address_parsed["state_abbr"] = normalize_state(failed_address_parsed.state)
 
     # update OMOP_location with addresses parsed with custom parser
     OMOP_address_updated = failed_address_parsed.combine_first(OMOP_address)
 
     # data quality flag for final set of parsed addresses
-    OMOP_address_updated["flag"] = OMOP_address_updated.apply(
-        lambda x: custom_flag(x), axis=1
-    )
+    with metrics.stage("custom_flag", rows_in=len(OMOP_address_updated)):
+        flag, flag_bits, rule_counts = custom_flag(OMOP_address_updated)
+        OMOP_address_updated["flag"] = flag
+        OMOP_address_updated["flag_bits"] = flag_bits
+    print(rule_counts.to_string(index=False))
+
+    with metrics.stage("write_csv", rows_in=len(OMOP_address_updated)):
+        OMOP_address_updated.to_csv(args.output_dir, index=False)
 
-    save_dir = os.path.join(abs_path, args.output_dir)
-    OMOP_address_updated.to_csv(save_dir, index=False)
+    if args.metrics is not None:
+        metrics.write(args.metrics, args.metrics_format, program="address_parsing")
 
 
 if __name__ == "__main__":
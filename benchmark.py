@@ -0,0 +1,395 @@
+import os
+import json
+import time
+import platform
+import subprocess
+import argparse
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import calculate_centroid
+import spatial_join
+import address_parsing
+from reproject import transform_xy
+from instrumentation import peak_rss_mb
+
+"""Address column schemas found across HIFLD layers"""
+hifld_schemas = {
+    "ADDRESS": {"street": "ADDRESS", "city": "CITY", "state": "STATE", "zip": "ZIP"},
+    "STREET": {"street": "STREET", "city": "CITY", "state": "STATE", "zip": "ZIPCODE"},
+    "STD_ADDR_B": {"street": "STD_ADDR_B", "city": "CITY", "state": "STNAME", "zip": "ZIPCODE"},
+}
+
+"""Synthetic HIFLD layers: geometry kind and address schema"""
+hifld_layers = {
+    "Synthetic_Prison_Boundaries": ("polygon", "ADDRESS"),
+    "Synthetic_Public_Schools": ("point", "STREET"),
+    "Synthetic_Places_Of_Worship": ("point", "STD_ADDR_B"),
+}
+
+"""Bounds of the contiguous US (lon/lat)"""
+conus_bounds = (-124.7, 24.5, -66.9, 49.4)
+
+street_names = ["Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park"]
+street_types = ["St", "Ave", "Rd", "Blvd", "Dr", "Ln", "Way", "Ct"]
+occupancies = ["APT", "SUITE", "UNIT"]
+cities = ["Seattle", "Spokane", "Tacoma", "Yakima", "Portland", "Boise", "Helena", "Fargo", "Tulsa", "Reno"]
+states = list(address_parsing.us_state_to_abbrev.items())[:51]
+
+
+def random_addresses(n, rng):
+    """
+    Generate address components
+
+    Parameters
+    ----------
+        n (int): number of addresses
+        rng (Generator): seeded numpy random generator
+
+    Returns
+    -------
+        components (dict): street, city, state name, state abbreviation and zip arrays
+    """
+    street = (
+        rng.integers(1, 20000, n).astype(str)
+        + " "
+        + rng.choice(street_names, n)
+        + " "
+        + rng.choice(street_types, n)
+    )
+    state_idx = rng.integers(0, len(states), n)
+
+    return {
+        "street": street,
+        "city": rng.choice(cities, n),
+        "state_name": np.array([states[i][0] for i in state_idx]),
+        "state_abbr": np.array([states[i][1] for i in state_idx]),
+        # 4-digit zip codes mimic HIFLD numeric ZIP fields with the leading 0 dropped
+        "zip": rng.integers(1000, 99999, n),
+    }
+
+
+def make_hifld_layer(n, kind, schema, seed=0):
+    """
+    Generate a HIFLD-like layer of polygons (EPSG:3857) or points (EPSG:4326
+        with x/y columns) with the given address schema
+
+    Parameters
+    ----------
+        n (int): number of features
+        kind (str): 'polygon' or 'point'
+        schema (str): key of hifld_schemas
+        seed (int): random seed
+
+    Returns
+    -------
+        gdf (GeoDataFrame)
+    """
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(conus_bounds[0], conus_bounds[2], n)
+    lat = rng.uniform(conus_bounds[1], conus_bounds[3], n)
+
+    components = random_addresses(n, rng)
+    cols = hifld_schemas[schema]
+    data = {
+        cols["street"]: components["street"],
+        cols["city"]: components["city"],
+        cols["state"]: components["state_abbr"] if cols["state"] == "STATE" else components["state_name"],
+        cols["zip"]: components["zip"],
+    }
+
+    if kind == "point":
+        data["x"] = lon
+        data["y"] = lat
+        return gpd.GeoDataFrame(data, geometry=shapely.points(lon, lat), crs="EPSG:4326")
+
+    # irregular 6-vertex building footprints of 50-500 m
+    x, y = transform_xy(lon, lat, "EPSG:4326", "EPSG:3857")
+    angles = np.linspace(0, 2 * np.pi, 7)[:-1]
+    radius = rng.uniform(50, 500, (n, 1)) * rng.uniform(0.6, 1.0, (n, 6))
+    rings = np.stack(
+        [x[:, None] + radius * np.cos(angles), y[:, None] + radius * np.sin(angles)],
+        axis=-1,
+    )
+
+    return gpd.GeoDataFrame(data, geometry=shapely.polygons(rings), crs="EPSG:3857")
+
+
+def make_land_layer(n, seed=0, vertices=256):
+    """
+    Generate vertex-heavy tribal/rural-like land polygons (EPSG:4269)
+
+    Parameters
+    ----------
+        n (int): number of polygons
+        seed (int): random seed
+        vertices (int): number of vertices per polygon ring
+
+    Returns
+    -------
+        gdf (GeoDataFrame)
+    """
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(conus_bounds[0], conus_bounds[2], n)
+    lat = rng.uniform(conus_bounds[1], conus_bounds[3], n)
+
+    angles = np.linspace(0, 2 * np.pi, vertices + 1)[:-1]
+    radius = rng.uniform(0.05, 1.0, (n, 1)) * rng.uniform(0.5, 1.0, (n, vertices))
+    rings = np.stack(
+        [lon[:, None] + radius * np.cos(angles), lat[:, None] + radius * np.sin(angles)],
+        axis=-1,
+    )
+
+    return gpd.GeoDataFrame(
+        {"GEOID": np.arange(n).astype(str), "NAME": [f"Land {i}" for i in range(n)]},
+        geometry=shapely.polygons(rings),
+        crs="EPSG:4269",
+    )
+
+
+def make_address_strings(n, seed=0):
+    """
+    Generate full address strings with occupancy designators and both
+        abbreviated and full state names
+
+    Parameters
+    ----------
+        n (int): number of addresses
+        seed (int): random seed
+
+    Returns
+    -------
+        addresses (Series)
+    """
+    rng = np.random.default_rng(seed)
+    components = random_addresses(n, rng)
+
+    street = pd.Series(components["street"])
+    occupancy = pd.Series(rng.choice(occupancies, n) + " " + rng.integers(1, 500, n).astype(str))
+    street = street.where(rng.random(n) > 0.2, street + " " + occupancy)
+
+    state = np.where(rng.random(n) > 0.3, components["state_abbr"], components["state_name"])
+    zip_code = pd.Series(components["zip"]).astype(str).str.zfill(5)
+
+    return street + ", " + components["city"] + ", " + state + " " + zip_code
+
+
+def write_synthetic_data(data_dir, size, seed=0):
+    """
+    Write synthetic HIFLD layers and a land layer as shapefiles
+
+    Parameters
+    ----------
+        data_dir (str): directory to write to
+        size (int): number of features per HIFLD layer
+        seed (int): random seed
+
+    Returns
+    -------
+        hifld_dir (str): directory of HIFLD layers
+        land_file (str): path of land layer
+    """
+    hifld_dir = os.path.join(data_dir, f"HIFLD_{size}")
+    for i, (layer, (kind, schema)) in enumerate(hifld_layers.items()):
+        layer_dir = os.path.join(hifld_dir, layer)
+        calculate_centroid.create_dir(layer_dir)
+        gdf = make_hifld_layer(size, kind, schema, seed=seed + i)
+        gdf.to_file(os.path.join(layer_dir, f"{layer}.shp"), driver="ESRI Shapefile")
+
+    land_dir = os.path.join(data_dir, "land")
+    calculate_centroid.create_dir(land_dir)
+    land_file = os.path.join(land_dir, "Synthetic_Tribal_Lands.shp")
+    make_land_layer(max(size // 100, 100), seed=seed).to_file(land_file, driver="ESRI Shapefile")
+
+    return hifld_dir, land_file
+
+
+def time_stage(results, stage, size, fn, *args, **kwargs):
+    """
+    Run and time one pipeline stage, recording wall time, throughput, the
+        process peak RSS after the stage and how much the stage raised it
+
+    Parameters
+    ----------
+        results (list): records to append to
+        stage (str): name of the stage
+        size (int): number of input rows
+        fn (function): stage function
+
+    Returns
+    -------
+        out: return value of fn
+    """
+    # ru_maxrss is a process high-water mark, a stage only shows if it raises it
+    peak_before = peak_rss_mb()
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak_after = peak_rss_mb()
+
+    if isinstance(out, dict):
+        rows_out = sum(len(df) for df in out.values())
+    else:
+        rows_out = len(out)
+
+    results.append(
+        {
+            "stage": stage,
+            "size": size,
+            "seconds": round(seconds, 6),
+            "rows_in": size,
+            "rows_out": rows_out,
+            "rows_per_second": round(size / seconds, 1) if seconds > 0 else None,
+            "process_peak_rss_mb": round(peak_after, 1),
+            "peak_rss_growth_mb": round(peak_after - peak_before, 1),
+        }
+    )
+    print(f"{stage:<48} {size:>10} rows {seconds:10.3f} s")
+
+    return out
+
+
+def run_benchmark(data_dir, size, seed=0, address_size=None):
+    """
+    Time each pipeline stage on synthetic data of the given size
+
+    Parameters
+    ----------
+        data_dir (str): directory for synthetic data
+        size (int): number of features per HIFLD layer
+        seed (int): random seed
+        address_size (int): number of address strings to parse, default min(size, 100000)
+
+    Returns
+    -------
+        results (list): one record per stage
+    """
+    results = []
+    hifld_dir, land_file = write_synthetic_data(data_dir, size, seed)
+
+    dict_centroid = {}
+    for layer in hifld_layers:
+        file = os.path.join(hifld_dir, layer, f"{layer}.shp")
+        df = time_stage(results, f"read_shp:{layer}", size, calculate_centroid.read_shp, file, rows=None)
+        df = time_stage(results, f"full_address:{layer}", size, calculate_centroid.full_address, df, layer)
+        dict_centroid.update(
+            time_stage(results, f"get_centroid:{layer}", size, calculate_centroid.get_centroid, {layer: df})
+        )
+
+    land = gpd.read_file(land_file)
+    points = {
+        layer: dict_centroid[layer].set_geometry("source_centroid").rename_geometry("geometry")
+        for layer in dict_centroid
+    }
+    time_stage(
+        results, "spatial_join", size * len(points), spatial_join.spatial_join, points, land, "tribal"
+    )
+
+    address_size = address_size or min(size, 100000)
+    addresses = make_address_strings(address_size, seed)
+    OMOP_df = pd.DataFrame({"location_source_value": addresses})
+    time_stage(results, "usaddress_parse", address_size, address_parsing.usaddress_parse, OMOP_df)
+    time_stage(
+        results,
+        "custom_parser",
+        address_size,
+        address_parsing.custom_parser,
+        OMOP_df,
+        address_col="location_source_value",
+        state_full_pattern=address_parsing.state_full_pattern,
+        state_abbr_pattern=address_parsing.state_abbr_pattern,
+    )
+
+    return results
+
+
+def git_revision():
+    """
+    Current git commit of the repository, if available
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline):
+    """
+    Print the change in wall time of each stage against a previous run
+
+    Parameters
+    ----------
+        results (list): records of this run
+        baseline (list): records of a previous run
+    """
+    previous = {(r["stage"], r["size"]): r["seconds"] for r in baseline}
+    for r in results:
+        key = (r["stage"], r["size"])
+        if key in previous and previous[key] > 0:
+            ratio = r["seconds"] / previous[key]
+            print(f"{r['stage']:<48} {r['size']:>10} {ratio:6.2f}x of baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark pipeline stages on synthetic HIFLD data"
+    )
+
+    # args
+    parser.add_argument("--data_dir", required=True, help="path to write synthetic geoshape files")
+    parser.add_argument(
+        "--output", required=True, help="path to save benchmark results (json)"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000],
+        help="Number of features per HIFLD layer, e.g. 10000 100000 1000000 10000000",
+    )
+    parser.add_argument(
+        "--address_size", type=int, default=None,
+        help="Number of address strings to parse, default min(size, 100000)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument(
+        "--compare", default=None, help="path of previous benchmark results (json) to compare to"
+    )
+
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(run_benchmark(args.data_dir, size, args.seed, args.address_size))
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": {
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "geopandas": gpd.__version__,
+            "shapely": shapely.__version__,
+        },
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            compare_results(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
+    print("Benchmark results saved")
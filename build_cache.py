@@ -0,0 +1,153 @@
+import os
+import json
+import shutil
+import hashlib
+
+"""Sidecar files that make up a shapefile"""
+shp_extensions = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+
+
+def file_fingerprint(file, cached=None):
+    """
+    Fingerprint a shapefile by size, modification time and content hash of
+        its .shp/.shx/.dbf/.prj/.cpg files. The content hash of a cached
+        fingerprint is reused when size and modification time are unchanged.
+
+    Parameters
+    ----------
+        file (str): path of .shp file
+        cached (dict): fingerprint from a previous build, default None
+
+    Returns
+    -------
+        fingerprint (dict): size, mtime and sha256
+    """
+    stem = os.path.splitext(file)[0]
+    paths = [stem + ext for ext in shp_extensions if os.path.exists(stem + ext)]
+
+    stats = [os.stat(path) for path in paths]
+    fingerprint = {
+        "size": sum(stat.st_size for stat in stats),
+        "mtime": max(stat.st_mtime for stat in stats),
+    }
+
+    if (
+        cached is not None
+        and cached["size"] == fingerprint["size"]
+        and cached["mtime"] == fingerprint["mtime"]
+    ):
+        fingerprint["sha256"] = cached["sha256"]
+        return fingerprint
+
+    sha256 = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+    fingerprint["sha256"] = sha256.hexdigest()
+
+    return fingerprint
+
+
+def load_manifest(manifest_path):
+    """
+    Load the build manifest of a previous run
+
+    Parameters
+    ----------
+        manifest_path (str): path of JSON build manifest
+
+    Returns
+    -------
+        manifest (dict): file name : {'fingerprint', 'params'}
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Save the build manifest
+
+    Parameters
+    ----------
+        manifest (dict): file name : {'fingerprint', 'params'}
+        manifest_path (str): path of JSON build manifest
+    """
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def plan_rebuild(catalog, manifest, params, cached_outputs):
+    """
+    Determine which layers must be recomputed because their source
+        fingerprint or the pipeline parameters changed, or their cached
+        output is missing
+
+    Parameters
+    ----------
+        catalog (dict): file name : metadata from build_catalog
+        manifest (dict): build manifest of the previous run
+        params (dict): pipeline parameters that affect the outputs
+        cached_outputs (dict): file name : path of the cached layer output
+
+    Returns
+    -------
+        stale (list): file names to recompute
+        fingerprints (dict): file name : fingerprint of the current source
+    """
+    stale = []
+    fingerprints = {}
+    for fname in catalog:
+        entry = manifest.get(fname)
+        fingerprints[fname] = file_fingerprint(
+            catalog[fname]["path"], None if entry is None else entry["fingerprint"]
+        )
+
+        if (
+            entry is None
+            or entry["fingerprint"]["sha256"] != fingerprints[fname]["sha256"]
+            or entry["params"] != params
+            or not os.path.exists(cached_outputs[fname])
+        ):
+            stale.append(fname)
+
+    return stale, fingerprints
+
+
+def remove_outputs(paths):
+    """
+    Remove stale layer outputs before they are recomputed
+
+    Parameters
+    ----------
+        paths (list): files or directories to remove
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def stitch_csv(csv_files, csv_path):
+    """
+    Concatenate per-layer csv files into one csv, keeping the first header
+
+    Parameters
+    ----------
+        csv_files (list): paths of per-layer csv files
+        csv_path (str): path of combined csv
+    """
+    with open(csv_path, "w") as out:
+        header_written = False
+        for file in csv_files:
+            with open(file, "r") as f:
+                header = f.readline()
+                if not header_written:
+                    out.write(header)
+                    header_written = True
+                shutil.copyfileobj(f, out)
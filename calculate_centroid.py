@@ -1,16 +1,82 @@
 import os
 import sys
+import json
 import re
 import csv
 
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from shp_catalog import build_catalog
+from reproject import to_crs
+from instrumentation import metrics, add_metrics_args, start_metrics
+from parquet_io import save_parquet
+from build_cache import (
+    load_manifest,
+    save_manifest,
+    plan_rebuild,
+    remove_outputs,
+    stitch_csv,
+)
+
+
+"""Candidate column names of each address component, in priority order"""
+address_schema = {
+    'street': ['ADDRESS', 'STREET', 'STD_ADDR_B'],
+    'city': ['CITY'],
+    'state': ['STATE', 'STNAME'],
+    'zip': ['ZIP', 'ZIPCODE'],
+}
+
+"""Per-layer overrides of address_schema, keyed by geoshape file name"""
+layer_address_schema = {}
+
+"""Equal-area CRS for centroid computation (NAD83 / Conus Albers)"""
+equal_area_crs = 'EPSG:5070'
+
+"""GeoParquet dataset directory of the combined centroid table"""
+parquet_dataset = 'centroids.parquet'
+
+"""Vectorized centroid methods"""
+centroid_methods = {
+    'centroid': shapely.centroid,
+    'representative_point': shapely.point_on_surface,
+}
+
+
+def address_columns(df, fname=None):
+    """
+    Resolve the column of each address component from the schema registry
+
+    Parameters
+    ----------
+        df (GeoDataFrame)
+        fname (str): geoshape file name for layer-specific overrides, default None
+
+    Returns
+    -------
+        cols (dict): address component : column name
+    """
+    schema = {**address_schema, **layer_address_schema.get(fname, {})}
+
+    cols = {}
+    for component, candidates in schema.items():
+        matches = [col for col in candidates if col in df.columns]
+        if not matches:
+            raise KeyError(
+                f"No {component} column in {fname or 'GeoDataFrame'}, expected one of {candidates}"
+            )
+        cols[component] = matches[0]
 
+    return cols
 
-def full_address(df):
+
+def full_address(df, fname=None):
     """
     Concatenate each address component to a full address string
          (Street, City, State ZIP)
@@ -18,39 +84,29 @@ def full_address(df):
     Parameters
     ----------
         df (GeoDataFrame)
+        fname (str): geoshape file name for layer-specific overrides, default None
 
     Returns
     -------
         df (GeoDataFrame): with 'full_address' column
     """
-    if 'ZIP' in df.columns:
-        zip_col = 'ZIP'
-    else:
-        zip_col = 'ZIPCODE'
+    cols = address_columns(df, fname)
+
+    # ZIP read as float from dbf numeric fields, drop the decimal
+    zip_code = df[cols['zip']]
+    if pd.api.types.is_float_dtype(zip_code):
+        zip_code = zip_code.astype('Int64')
+
+    # left pad zip code to 5 digits
+    zip_code = zip_code.astype('object').where(zip_code.notna(), 'NaN').astype('str')
+    df['zip'] = zip_code.where(~zip_code.str.isdigit(), zip_code.str.zfill(5))
+
+    street = df[cols['street']].fillna('NaN').astype('str')
+    city = df[cols['city']].fillna('NaN').astype('str')
+    state = df[cols['state']].fillna('NaN').astype('str')
+
+    df['Full_Address'] = street.str.cat([city, state], sep=', ') + ' ' + df['zip']
 
-    if 'STATE' in df.columns:
-        state_col = 'STATE'
-    else:
-        state_col = 'STNAME'
-
-    if 'ADDRESS' in df.columns:
-        addr_col = 'ADDRESS'
-    elif 'ADDRESS' not in df.columns:
-        addr_col = 'STREET'
-    elif ('STREET' not in df.columns) and ('ADDRESS' not in df.columns):
-        addr_col = 'STD_ADDR_B'
-
-    # add 0 to zip code if only 4 digits
-    df['zip'] = df[zip_col].astype('str')
-    df['zip'] = df['zip'].apply(lambda x: '0' + x if len(x) <5 else x)
-    
-    df[addr_col] = df[addr_col].astype('str')
-    df['CITY'] = df['CITY'].astype('str')
-    df[state_col] = df[state_col].astype('str')
-    
-    df['Full_Address'] = df[[addr_col, 'CITY', state_col]].fillna('NaN').agg(', '.join, axis=1) + ' ' + df['zip']
-    df['Full_Address'] = df['Full_Address'].astype('str')
-             
     return df
 
 
@@ -71,6 +127,41 @@ def read_shp(file, rows=100):
     return df
 
 
+def iter_shp_chunks(file, chunksize=10000, rows=None):
+    """
+    Read geoshapes file in fixed-size feature windows so that only one
+        window is held in memory at a time
+
+    Parameters
+    ----------
+        file (str): path of geoshape file
+        chunksize (int): number of features per window
+        rows (int): total number of rows to read, default None reads all rows
+
+    Yields
+    ------
+        df (GeoDataFrame): with index offset to the feature position in the file,
+            a single empty window for a layer without features
+    """
+    start = 0
+    while rows is None or start < rows:
+        stop = start + chunksize if rows is None else min(start + chunksize, rows)
+        with metrics.stage("read_shp") as m:
+            df = gpd.read_file(file, rows=slice(start, stop))
+            m["rows_out"] = len(df)
+        # an empty layer still yields one window so its outputs are written
+        if df.empty and start > 0:
+            break
+
+        df.index = pd.RangeIndex(start, start + len(df))
+        yield df
+
+        # short window means the end of the file was reached
+        if len(df) < stop - start:
+            break
+        start = stop
+
+
 def convert_EPSG4326(dict):
     """
     Convert each GeoDataFrame to 'EPSG:4326'
@@ -84,18 +175,49 @@ def convert_EPSG4326(dict):
         dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS
     """
     for fname in dict:
-        dict[fname] = dict[fname].to_crs("EPSG:4326")
+        dict[fname] = to_crs(dict[fname], "EPSG:4326")
 
     return dict
 
 
-def get_centroid(dict):
+def centroid_points(geometry, method='centroid', crs=equal_area_crs):
     """
-    Convert each GeoDataFrame to 'EPSG:4326'
+    Compute one centroid per geometry in the equal-area crs, whatever the CRS
+        of the geoshapes, and return the points in 'EPSG:4326'
+
+    Parameters
+    ----------
+        geometry (GeoSeries): geoshapes with a CRS set
+        method (str): 'centroid' or 'representative_point', which is guaranteed
+            to fall inside concave polygons
+        crs (str): equal-area CRS the centroids are computed in
+
+    Returns
+    -------
+        points (GeoSeries): centroids of 'EPSG:4326' CRS
+    """
+    if method not in centroid_methods:
+        raise ValueError(f"method must be one of {list(centroid_methods)}")
+
+    # centroids are computed in the equal-area CRS; to_crs skips no-op transforms
+    geometry = to_crs(geometry, crs)
+
+    points = centroid_methods[method](np.asarray(geometry.values))
+    points = gpd.GeoSeries(points, index=geometry.index, crs=geometry.crs)
+
+    return to_crs(points, "EPSG:4326")
+
+
+def get_centroid(dict, method='centroid', centroid_crs=equal_area_crs):
+    """
+    Extract centroids of 'EPSG:4326' CRS from each GeoDataFrame. Geoshapes
+        in any CRS are projected to centroid_crs to compute the centroids.
          
     Parameters
     ----------
-        dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS
+        dict (dictionary): GeoDataFrames with a CRS set
+        method (str): 'centroid' or 'representative_point'
+        centroid_crs (str): equal-area CRS the centroids are computed in
 
     Returns
     -------
@@ -106,11 +228,15 @@ def get_centroid(dict):
         if 'x' in dict[fname].columns:
             dict[fname] = dict[fname].rename(columns={'x': 'source_lon', 'y': 'source_lat'})
             dict[fname]['Place_type'] = os.path.basename(fname)
-            dict[fname]['source_centroid'] = dict[fname]['geometry']
+            dict[fname]['source_centroid'] = to_crs(dict[fname]['geometry'], "EPSG:4326")
         else:
-            dict[fname]['source_centroid'] = dict[fname]['geometry'].centroid
-            dict[fname]['source_lon'] = dict[fname]['geometry'].centroid.x
-            dict[fname]['source_lat'] = dict[fname]['geometry'].centroid.y
+            # compute each centroid once and reuse its coordinates
+            points = centroid_points(dict[fname]['geometry'], method, centroid_crs)
+            coords = shapely.get_coordinates(np.asarray(points.values))
+
+            dict[fname]['source_centroid'] = points
+            dict[fname]['source_lon'] = coords[:, 0]
+            dict[fname]['source_lat'] = coords[:, 1]
             dict[fname]['Place_type'] = os.path.basename(fname)
 
         dict_centroids[fname] = keep_columns(dict[fname])
@@ -151,7 +277,207 @@ def save_shp(dict, save_dir):
         save_path = os.path.join(save_dir, f"{fname}")
         create_dir(save_path)
         
-        shp_file.to_file(save_path, driver='ESRI Shapefile')
+        shp_file.to_file(os.path.join(save_path, f"{fname}.shp"), driver='ESRI Shapefile')
+
+
+def save_centroids(dict, save_dir, output_format="shp", part=None):
+    """
+    Save centroid GeoDataFrames with the selected output backend
+
+    Parameters
+    ----------
+        dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS with extracted centroids
+        save_dir (str): path of desired output directory
+        output_format (str): 'shp' for a geoshape file per layer or 'parquet'
+            for a GeoParquet dataset partitioned by Place_type
+        part (int): window number of the layer, default None; windows of a
+            layer are appended to its geoshape file in order, starting at 0
+    """
+    if output_format == "parquet":
+        save_parquet(dict, os.path.join(save_dir, parquet_dataset), part=part)
+        return
+
+    if part is None:
+        save_shp(dict, save_dir)
+        return
+
+    for fname in dict:
+        save_path = os.path.join(save_dir, f"{fname}")
+        create_dir(save_path)
+
+        shp_file = dict[fname].set_geometry("source_centroid")
+        shp_file.to_file(
+            os.path.join(save_path, f"{fname}.shp"),
+            driver="ESRI Shapefile",
+            mode="w" if part == 0 else "a",
+        )
+
+
+def process_shp_chunked(
+    file,
+    save_dir,
+    chunksize=10000,
+    rows=None,
+    csv_path=None,
+    method="centroid",
+    centroid_crs=equal_area_crs,
+    output_format="shp",
+):
+    """
+    Stream a geoshape file through full_address -> get_centroid and append
+        each window to the output files
+
+    Parameters
+    ----------
+        file (str): path of geoshape file
+        save_dir (str): path of desired output directory
+        chunksize (int): number of features per window
+        rows (int): total number of rows to read, default None reads all rows
+        csv_path (str): path of combined centroid csv to append to, default None
+        method (str): 'centroid' or 'representative_point'
+        centroid_crs (str): equal-area CRS the centroids are computed in
+        output_format (str): 'shp' or 'parquet'
+
+    Returns
+    -------
+        n_rows (int): number of centroids written
+    """
+    fname = os.path.basename(file).split(".")[0]
+
+    n_rows = 0
+    for part, df in enumerate(iter_shp_chunks(file, chunksize=chunksize, rows=rows)):
+        with metrics.stage("full_address", rows_in=len(df)):
+            dict_address = {fname: full_address(df, fname)}
+        with metrics.stage("get_centroid", rows_in=len(df)):
+            dict_centroid = get_centroid(dict_address, method, centroid_crs)
+
+        with metrics.stage("save_centroids", rows_in=len(df)):
+            save_centroids(dict_centroid, save_dir, output_format, part=part)
+
+        if csv_path is not None:
+            with metrics.stage("write_csv", rows_in=len(df)):
+                write_header = not os.path.exists(csv_path)
+                dict_centroid[fname].to_csv(
+                    csv_path, mode="a", header=write_header, index=False
+                )
+
+        n_rows += len(df)
+
+    return n_rows
+
+
+def plan_tasks(catalog, chunksize=None, rows=None):
+    """
+    Split geoshape files into per-file or per-window tasks for a process pool
+
+    Parameters
+    ----------
+        catalog (dict): file name : metadata from build_catalog
+        chunksize (int): number of features per task, default None is one task per file
+        rows (int): total number of rows to read per file, default None reads all rows
+
+    Returns
+    -------
+        tasks (list): of (file, start, stop, part) tuples
+    """
+    tasks = []
+    for fname in catalog:
+        file = catalog[fname]["path"]
+        n_rows = catalog[fname]["feature_count"]
+        if rows is not None:
+            n_rows = rows if n_rows is None else min(rows, n_rows)
+
+        if chunksize is None or n_rows is None or n_rows <= chunksize:
+            tasks.append((file, 0, n_rows, None))
+            continue
+
+        for part, start in enumerate(range(0, n_rows, chunksize)):
+            tasks.append((file, start, min(start + chunksize, n_rows), part))
+
+    return tasks
+
+
+def centroid_task(
+    task, save_dir, method="centroid", centroid_crs=equal_area_crs, output_format="shp"
+):
+    """
+    Run full_address -> get_centroid on one geoshape file or one window of
+        it. Parquet parts are saved by the worker, geoshape files are appended
+        by the parent in task order so each layer stays a single file.
+
+    Parameters
+    ----------
+        task (tuple): (file, start, stop, part) from plan_tasks
+        save_dir (str): path of desired output directory
+        method (str): 'centroid' or 'representative_point'
+        centroid_crs (str): equal-area CRS the centroids are computed in
+        output_format (str): 'shp' or 'parquet'
+
+    Returns
+    -------
+        df (GeoDataFrame): centroids of the task
+    """
+    file, start, stop, part = task
+    fname = os.path.basename(file).split(".")[0]
+
+    df = read_shp(file, rows=slice(start, stop))
+    dict_address = {fname: full_address(df, fname)}
+    dict_centroid = get_centroid(dict_address, method, centroid_crs)
+
+    if output_format == "parquet":
+        save_centroids(dict_centroid, save_dir, output_format, part=part)
+
+    return dict_centroid[fname]
+
+
+def run_parallel(
+    tasks,
+    save_dir,
+    csv_dir,
+    workers,
+    method="centroid",
+    centroid_crs=equal_area_crs,
+    output_format="shp",
+):
+    """
+    Send centroid tasks to a process pool and append results to each layer's
+        geoshape file and centroid csv in task order as they are returned
+
+    Parameters
+    ----------
+        tasks (list): of (file, start, stop, part) tuples from plan_tasks
+        save_dir (str): path of desired output directory
+        csv_dir (str): directory of per-layer centroid csv files, None skips the csv
+        workers (int): number of worker processes
+        method (str): 'centroid' or 'representative_point'
+        centroid_crs (str): equal-area CRS the centroids are computed in
+        output_format (str): 'shp' or 'parquet'
+
+    Returns
+    -------
+        n_rows (int): number of centroids written
+    """
+    n_rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            centroid_task,
+            tasks,
+            [save_dir] * len(tasks),
+            [method] * len(tasks),
+            [centroid_crs] * len(tasks),
+            [output_format] * len(tasks),
+        )
+        for task, df in zip(tasks, results):
+            fname = os.path.basename(task[0]).split(".")[0]
+            if output_format == "shp":
+                save_centroids({fname: df}, save_dir, output_format, part=task[3])
+            if csv_dir is not None:
+                csv_path = os.path.join(csv_dir, f"{fname}.csv")
+                write_header = not os.path.exists(csv_path)
+                df.to_csv(csv_path, mode="a", header=write_header, index=False)
+            n_rows += len(df)
+
+    return n_rows
 
 
 def create_dir(save_dir):
@@ -162,8 +488,7 @@ def create_dir(save_dir):
     ----------
         save_dir (str): path of desired output directory
     """
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
+    os.makedirs(save_dir, exist_ok=True)
 
 
 def main():
@@ -172,15 +497,55 @@ def main():
     )
 
     # args
-    parser.add_argument("data_dir", required=True, help="path of geoshape files")
+    parser.add_argument("--data_dir", required=True, help="path of geoshape files")
+    parser.add_argument(
+        "--output_dir", required=True, help="path to save centroid geoshape files"
+    )
     parser.add_argument(
-        "output_dir", required=True, help="path to save centroid geoshape files"
+        "--rows",
+        type=int,
+        default=100,
+        help="Number of rows to count per geoshape file, 0 reads all rows",
     )
     parser.add_argument(
-        "rows", default=100, help="Number of rows to count per geoshape file"
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Number of features per window to stream through the pipeline",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, each handling one geoshape file or window",
+    )
+    parser.add_argument(
+        "--centroid_method",
+        default="centroid",
+        choices=list(centroid_methods),
+        help="centroid, or representative_point to guarantee a point inside concave polygons",
+    )
+    parser.add_argument(
+        "--centroid_crs",
+        default=equal_area_crs,
+        help="Equal-area CRS the centroids are computed in",
+    )
+    parser.add_argument(
+        "--output_format",
+        default="shp",
+        choices=["shp", "parquet"],
+        help="shp for geoshape files and a combined csv, or parquet for a GeoParquet dataset partitioned by Place_type",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recompute every geoshape file instead of reusing cached outputs",
     )
 
+    add_metrics_args(parser)
+
     args = parser.parse_args()
+    start_metrics(parser, args)
 
     HIFLD_path = args.data_dir
     shp_files = [
@@ -190,36 +555,132 @@ def main():
         if name.endswith((".shp"))
     ]
 
-    # number of observations per geoshape file 
-    for file in shp_files:
-        with open(file, 'rb') as f:
-            row_count = len(f.readlines()) - 1
-            
-            basename = os.path.basename(file).split('/')[0]
-            fname = os.path.basename(basename).split('.')[0]
-            
-            print('There are {} observations in {}.'.format(row_count, fname))
-
-    dict_address = dict()
-    for file in shp_files:
-        basename = os.path.basename(file).split("/")[0]
-        fname = os.path.basename(basename).split(".")[0]
-
-        # print(file)
-        df = read_shp(file, rows=args.rows)
-        dict_address[fname] = full_address(df)
-
-    dict_EPSG4326 = convert_EPSG4326(dict_address)
-    dict_centroid = get_centroid(dict_EPSG4326)
-    
+    rows = args.rows if args.rows > 0 else None
+
     # save_dir = os.path.join(abs_path, 'data/HIFLD/centroids')
     save_dir = args.output_dir
     create_dir(save_dir)
 
-    save_shp(dict_centroid, save_dir)
+    # number of observations per geoshape file from the file headers
+    with metrics.stage("catalog") as m:
+        catalog = build_catalog(shp_files, os.path.join(save_dir, "catalog.json"))
+        m["rows_out"] = len(catalog)
+    for fname in catalog:
+        print('There are {} observations in {}.'.format(catalog[fname]['feature_count'], fname))
+
+    # per-layer outputs are cached and reused while the source fingerprint and
+    # parameters are unchanged
+    cache_dir = os.path.join(save_dir, ".cache")
+    create_dir(cache_dir)
+    manifest_path = os.path.join(save_dir, "build_manifest.json")
+
+    params = json.loads(json.dumps({
+        'rows': rows,
+        'centroid_method': args.centroid_method,
+        'centroid_crs': args.centroid_crs,
+        'output_format': args.output_format,
+        'address_schema': address_schema,
+        'layer_address_schema': layer_address_schema,
+    }))
+
+    # combined centroid table is the GeoParquet dataset itself for parquet output
+    if args.output_format == "parquet":
+        cached_outputs = {
+            fname: os.path.join(save_dir, parquet_dataset, f"Place_type={fname}")
+            for fname in catalog
+        }
+        csv_dir = None
+    else:
+        cached_outputs = {
+            fname: os.path.join(cache_dir, f"{fname}.csv") for fname in catalog
+        }
+        csv_dir = cache_dir
+
+    manifest = {} if args.force else load_manifest(manifest_path)
+    with metrics.stage("fingerprint", rows_in=len(catalog)) as m:
+        stale, fingerprints = plan_rebuild(catalog, manifest, params, cached_outputs)
+        m["rows_out"] = len(stale)
+    print('Recomputing {} of {} geoshape files.'.format(len(stale), len(catalog)))
+
+    remove_outputs(
+        [cached_outputs[fname] for fname in stale]
+        + [os.path.join(save_dir, f"{fname}") for fname in stale]
+    )
+    stale_catalog = {fname: catalog[fname] for fname in stale}
+    stale_files = [catalog[fname]['path'] for fname in stale]
+
+    # distribute geoshape files or windows of them across a process pool
+    if args.workers > 1:
+        tasks = plan_tasks(stale_catalog, chunksize=args.chunksize, rows=rows)
+        # stages run in the worker processes, only the pool as a whole is timed
+        with metrics.stage("centroid_tasks") as m:
+            m["rows_out"] = run_parallel(
+                tasks,
+                save_dir,
+                csv_dir,
+                args.workers,
+                method=args.centroid_method,
+                centroid_crs=args.centroid_crs,
+                output_format=args.output_format,
+            )
+
+    # stream each geoshape file in fixed-size windows to keep memory flat
+    elif args.chunksize:
+        for fname in stale:
+            process_shp_chunked(
+                catalog[fname]['path'],
+                save_dir,
+                chunksize=args.chunksize,
+                rows=rows,
+                csv_path=None if csv_dir is None else cached_outputs[fname],
+                method=args.centroid_method,
+                centroid_crs=args.centroid_crs,
+                output_format=args.output_format,
+            )
 
-    gpd_concat = pd.concat([dict_centroid[fname] for fname in dict_centroid])
-    gpd_concat.to_csv(os.path.join(save_dir, "centroids_40k.csv"), index=False)
+    else:
+        dict_address = dict()
+        for file in stale_files:
+            basename = os.path.basename(file).split("/")[0]
+            fname = os.path.basename(basename).split(".")[0]
+
+            # print(file)
+            with metrics.stage("read_shp") as m:
+                df = read_shp(file, rows=rows)
+                m["rows_out"] = len(df)
+            with metrics.stage("full_address", rows_in=len(df)):
+                dict_address[fname] = full_address(df, fname)
+
+        n_rows = sum(len(dict_address[fname]) for fname in dict_address)
+
+        # only the centroids are reprojected to 'EPSG:4326', not the geoshapes
+        with metrics.stage("get_centroid", rows_in=n_rows):
+            dict_centroid = get_centroid(
+                dict_address, method=args.centroid_method, centroid_crs=args.centroid_crs
+            )
+
+        with metrics.stage("save_centroids", rows_in=n_rows):
+            save_centroids(dict_centroid, save_dir, args.output_format)
+
+        if csv_dir is not None:
+            with metrics.stage("write_csv", rows_in=n_rows):
+                for fname in dict_centroid:
+                    dict_centroid[fname].to_csv(cached_outputs[fname], index=False)
+
+    for fname in stale:
+        manifest[fname] = {'fingerprint': fingerprints[fname], 'params': params}
+    save_manifest(manifest, manifest_path)
+
+    # stitch the combined centroid csv from the per-layer cache
+    if csv_dir is not None:
+        with metrics.stage("stitch_csv"):
+            stitch_csv(
+                [cached_outputs[fname] for fname in catalog],
+                os.path.join(save_dir, "centroids_40k.csv"),
+            )
+
+    if args.metrics is not None:
+        metrics.write(args.metrics, args.metrics_format, program="calculate_centroid")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import resource
+from contextlib import contextmanager
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class Metrics:
+    """
+    Per-stage wall time, rows in/out, throughput and peak memory of a run.
+        Repeated stages (e.g., one per window) are accumulated under one name.
+        Only one stage is profiled at a time; a stage nested in a profiled
+        stage is timed, and its calls count towards the outer stage's profile.
+    """
+
+    def __init__(self, profile=False):
+        self.stages = {}
+        self.profile = profile
+        self.profiles = {}
+        self.profiling = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Time a stage. The yielded record accepts 'rows_in' and 'rows_out'.
+
+        Parameters
+        ----------
+            name (str): name of the stage
+            rows_in (int): number of input rows, default None
+        """
+        record = {"rows_in": rows_in, "rows_out": None}
+
+        # cProfile allows one active profiler, so nested stages are not profiled
+        profiler = None
+        if self.profile and not self.profiling:
+            profiler = self.profiles.setdefault(name, cProfile.Profile())
+            profiler.enable()
+            self.profiling = True
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                self.profiling = False
+            self.add(name, seconds, record["rows_in"], record["rows_out"])
+
+    def add(self, name, seconds, rows_in=None, rows_out=None):
+        """
+        Accumulate a timed stage
+
+        Parameters
+        ----------
+            name (str): name of the stage
+            seconds (float): wall time
+            rows_in (int): number of input rows, default None
+            rows_out (int): number of output rows, default None
+        """
+        stage = self.stages.setdefault(
+            name, {"calls": 0, "seconds": 0.0, "rows_in": None, "rows_out": None}
+        )
+        stage["calls"] += 1
+        stage["seconds"] += seconds
+        for key, rows in (("rows_in", rows_in), ("rows_out", rows_out)):
+            if rows is not None:
+                stage[key] = (stage[key] or 0) + rows
+        stage["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    def records(self):
+        """
+        Stage records with rows per second
+
+        Returns
+        -------
+            records (list): one dict per stage in the order first seen
+        """
+        records = []
+        for name, stage in self.stages.items():
+            rows = stage["rows_in"] if stage["rows_in"] is not None else stage["rows_out"]
+            rows_per_second = None
+            if rows is not None and stage["seconds"] > 0:
+                rows_per_second = round(rows / stage["seconds"], 1)
+
+            records.append(
+                {
+                    "stage": name,
+                    "calls": stage["calls"],
+                    "seconds": round(stage["seconds"], 6),
+                    "rows_in": stage["rows_in"],
+                    "rows_out": stage["rows_out"],
+                    "rows_per_second": rows_per_second,
+                    "peak_rss_mb": stage["peak_rss_mb"],
+                }
+            )
+
+        return records
+
+    def write_jsonl(self, path, program=None):
+        """
+        Append one JSON line per stage
+
+        Parameters
+        ----------
+            path (str): path of JSON lines file
+            program (str): name of the CLI, default None
+        """
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(path, "a") as f:
+            for record in self.records():
+                f.write(json.dumps({"program": program, "timestamp": timestamp, **record}) + "\n")
+
+    def write_prometheus(self, path, program=None):
+        """
+        Write stage metrics in the Prometheus text exposition format
+
+        Parameters
+        ----------
+            path (str): path of text file
+            program (str): name of the CLI, default None
+        """
+        gauges = {
+            "stage_seconds": "seconds",
+            "stage_rows_in": "rows_in",
+            "stage_rows_out": "rows_out",
+            "stage_rows_per_second": "rows_per_second",
+            "stage_peak_rss_megabytes": "peak_rss_mb",
+        }
+
+        lines = []
+        for metric, key in gauges.items():
+            lines.append(f"# TYPE uw_geospatial_{metric} gauge")
+            for record in self.records():
+                if record[key] is None:
+                    continue
+                labels = f'program="{program}",stage="{record["stage"]}"'
+                lines.append(f"uw_geospatial_{metric}{{{labels}}} {record[key]}")
+
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def write(self, path, metrics_format="jsonl", program=None):
+        """
+        Export stage metrics, and the cProfile stats of the hottest stage to
+            <path>.prof if profiling is enabled
+
+        Parameters
+        ----------
+            path (str): path of metrics file
+            metrics_format (str): 'jsonl' or 'prometheus'
+            program (str): name of the CLI, default None
+        """
+        if metrics_format == "prometheus":
+            self.write_prometheus(path, program)
+        else:
+            self.write_jsonl(path, program)
+
+        if self.profiles:
+            hottest = max(self.profiles, key=lambda name: self.stages[name]["seconds"])
+            pstats.Stats(self.profiles[hottest]).dump_stats(f"{path}.prof")
+            print(f"cProfile stats of the hottest stage '{hottest}' saved to {path}.prof")
+
+    def reset(self, profile=False):
+        """
+        Clear all stages
+
+        Parameters
+        ----------
+            profile (bool): capture cProfile data for each stage
+        """
+        self.__init__(profile=profile)
+
+
+"""Metrics of the current run, shared by the pipeline functions"""
+metrics = Metrics()
+
+
+def start_metrics(parser, args):
+    """
+    Reset the shared metrics for a CLI run, resolving --metrics against the
+        working directory at start-up
+
+    Parameters
+    ----------
+        parser (ArgumentParser): with add_metrics_args
+        args (Namespace): parsed arguments
+    """
+    if args.profile and args.metrics is None:
+        parser.error("--profile requires --metrics")
+
+    if args.metrics is not None:
+        args.metrics = os.path.abspath(args.metrics)
+
+    metrics.reset(profile=args.profile)
+
+
+def add_metrics_args(parser):
+    """
+    Add --metrics, --metrics_format and --profile to a CLI
+
+    Parameters
+    ----------
+        parser (ArgumentParser)
+    """
+    parser.add_argument(
+        "--metrics", default=None, help="path to save per-stage metrics"
+    )
+    parser.add_argument(
+        "--metrics_format",
+        default="jsonl",
+        choices=["jsonl", "prometheus"],
+        help="JSON lines or Prometheus text format",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Capture cProfile data of the hottest stage to <metrics>.prof",
+    )
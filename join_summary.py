@@ -0,0 +1,203 @@
+import os
+
+import pandas as pd
+
+"""Columns holding the state of a centroid, in order of preference"""
+state_columns = ["STATE", "state", "STUSPS"]
+
+"""Address columns of centroid files (shapefiles truncate names to 10 characters)"""
+address_columns = ["Full_Address", "Full_Addre"]
+
+"""Breakdown keys of a join summary"""
+summary_keys = ["Dataset", "Place_type", "state", "flag"]
+
+
+def centroid_states(df):
+    """
+    State of each centroid, from a state column or else parsed from the
+        'street, city, state zip' full address
+
+    Parameters
+    ----------
+        df (DataFrame): joined centroids
+
+    Returns
+    -------
+        state (Series): 'unknown' where the state is missing
+    """
+    state = None
+    for col in state_columns:
+        if col in df.columns:
+            state = df[col].astype("string")
+            break
+
+    if state is None:
+        for col in address_columns:
+            if col in df.columns:
+                state = df[col].astype("string").str.extract(r",\s*([^,]*?)\s+\S+\s*$", expand=False)
+                break
+
+    if state is None:
+        return pd.Series("unknown", index=df.index)
+
+    state = state.str.strip()
+
+    return state.where(state.notna() & (state != "") & (state != "NaN"), "unknown").astype(object)
+
+
+class JoinSummary:
+    """
+    Running counts of joined rows and flagged rows by dataset, Place_type,
+        state and land-layer flag. Updated batch by batch, and partial
+        summaries of separate workers or runs can be merged.
+    """
+
+    def __init__(self, flags=None):
+        self.flags = ["Tribal", "Rural", "Other"] if flags is None else list(flags)
+        self.counts = pd.DataFrame(
+            {"rows": pd.Series(dtype="int64"), "flagged": pd.Series(dtype="int64")},
+            index=pd.MultiIndex.from_arrays([[]] * len(summary_keys), names=summary_keys),
+        )
+
+    def update(self, fname, df):
+        """
+        Add the counts of a joined batch
+
+        Parameters
+        ----------
+            fname (str): name of the dataset
+            df (DataFrame): joined batch with 0/1 flag columns
+        """
+        flags = [col for col in self.flags if col in df.columns]
+        if not flags or df.empty:
+            return
+
+        keys = pd.DataFrame(
+            {
+                "Dataset": fname,
+                "Place_type": df["Place_type"].astype(str).values if "Place_type" in df.columns else fname,
+                "state": centroid_states(df).values,
+            }
+        )
+        values = pd.DataFrame(df[flags]).reset_index(drop=True)
+
+        # rows and flagged rows of every flag and group in one aggregation
+        partial = (
+            pd.concat([keys, values], axis=1)
+            .melt(id_vars=summary_keys[:-1], value_vars=flags, var_name="flag")
+            .groupby(summary_keys, sort=False)["value"]
+            .agg(["count", "sum"])
+        )
+        partial.columns = ["rows", "flagged"]
+
+        self.add(partial.astype("int64"))
+
+    def add(self, counts):
+        """
+        Add counts indexed by the summary keys
+
+        Parameters
+        ----------
+            counts (DataFrame): 'rows' and 'flagged' columns
+        """
+        if self.counts.empty:
+            self.counts = counts.copy()
+        else:
+            self.counts = pd.concat([self.counts, counts]).groupby(level=summary_keys, sort=False).sum()
+
+    def merge(self, other):
+        """
+        Merge the counts of another summary, e.g., of a parallel worker
+
+        Parameters
+        ----------
+            other (JoinSummary)
+
+        Returns
+        -------
+            self (JoinSummary)
+        """
+        self.flags += [col for col in other.flags if col not in self.flags]
+        self.add(other.counts)
+
+        return self
+
+    def table(self, by=("Dataset",)):
+        """
+        Counts of unflagged and flagged rows per group, with a
+            'not_<flag>' and '<flag>' column per flag
+
+        Parameters
+        ----------
+            by (tuple): breakdown keys among 'Dataset', 'Place_type' and 'state'
+
+        Returns
+        -------
+            summary_df (DataFrame)
+        """
+        by = list(by)
+        if self.counts.empty:
+            return pd.DataFrame(columns=by)
+
+        counts = self.counts.groupby(level=by + ["flag"], sort=False).sum()
+        counts["not_flagged"] = counts["rows"] - counts["flagged"]
+        counts = counts[["not_flagged", "flagged"]].unstack("flag", fill_value=0)
+
+        summary_df = counts.index.to_frame(index=False)
+        for flag in self.flags:
+            if flag in counts.columns.get_level_values("flag"):
+                label = flag.lower()
+                summary_df[f"not_{label}"] = counts[("not_flagged", flag)].values
+                summary_df[label] = counts[("flagged", flag)].values
+
+        return summary_df
+
+    def save(self, path):
+        """
+        Save the counts as a csv file that load() can merge later
+
+        Parameters
+        ----------
+            path (str): path of csv file
+        """
+        self.counts.reset_index().to_csv(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load counts saved by save()
+
+        Parameters
+        ----------
+            path (str): path of csv file
+
+        Returns
+        -------
+            summary (JoinSummary)
+        """
+        counts = pd.read_csv(path, dtype={key: str for key in summary_keys}, keep_default_na=False)
+        summary = cls(flags=list(dict.fromkeys(counts["flag"])))
+        summary.add(counts.set_index(summary_keys)[["rows", "flagged"]].astype("int64"))
+
+        return summary
+
+    def write(self, output_dir):
+        """
+        Write summary.csv with the counts per dataset and
+            summary_breakdown.csv with the counts per dataset, Place_type and state
+
+        Parameters
+        ----------
+            output_dir (str): path to save the csv files
+
+        Returns
+        -------
+            summary_df (DataFrame): counts per dataset
+        """
+        summary_df = self.table()
+        summary_df.to_csv(os.path.join(output_dir, "summary.csv"), index=False)
+        self.table(("Dataset", "Place_type", "state")).to_csv(
+            os.path.join(output_dir, "summary_breakdown.csv"), index=False
+        )
+
+        return summary_df
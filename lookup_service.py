@@ -0,0 +1,287 @@
+import os
+import json
+import datetime
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import argparse
+
+from spatial_join import load_layers, enrich
+
+"""Maximum number of points per lookup request"""
+max_points = 1000000
+
+
+def json_values(values, dtype):
+    """
+    Values of a column as JSON-native Python objects, cast to the dtype of
+        the source attribute (unmatched rows turn integer columns to float)
+
+    Parameters
+    ----------
+        values (Series): column of an enriched frame
+        dtype (dtype): dtype of the source attribute
+
+    Returns
+    -------
+        values (list): None where the value is missing
+    """
+    missing = values.isna().to_numpy()
+    present = values[~missing]
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        present = [v.isoformat() for v in pd.to_datetime(present)]
+    elif pd.api.types.is_bool_dtype(dtype):
+        present = present.astype(bool).tolist()
+    elif pd.api.types.is_integer_dtype(dtype):
+        present = present.astype(np.int64).tolist()
+    elif pd.api.types.is_float_dtype(dtype):
+        present = present.astype(float).tolist()
+    else:
+        present = [
+            v.item() if isinstance(v, np.generic)
+            else v.isoformat() if isinstance(v, (datetime.date, datetime.time))
+            else v
+            for v in present
+        ]
+
+    result = np.full(len(values), None, dtype=object)
+    result[~missing] = present
+
+    return result.tolist()
+
+
+class LookupService:
+    """
+    Land layers kept in memory to classify batches of lon/lat points.
+        At most max_concurrent lookups run at a time; further requests wait
+        up to timeout seconds for a slot.
+    """
+
+    def __init__(self, layers, max_concurrent=4, timeout=30):
+        self.layers = layers
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.timeout = timeout
+
+        # dtypes of the source attributes, as unmatched rows turn integers to float
+        self.dtypes = {
+            f"{name}_{col}": index.attributes[col].dtype
+            for name, index, columns in layers
+            for col in columns
+        }
+
+        # decode and prepare every polygon up front, so lookups only read the indexes
+        for name, index, columns in layers:
+            for layer_index in (index, index.cells):
+                if layer_index is not None and len(layer_index):
+                    layer_index.get_geometries(np.arange(len(layer_index)))
+
+    def describe(self):
+        """
+        Land layers and the columns a lookup returns
+
+        Returns
+        -------
+            layers (dict): layer name : {'polygons', 'columns'}
+        """
+        return {
+            name: {
+                "polygons": len(index),
+                "columns": [name.title()] + [f"{name}_{col}" for col in columns],
+            }
+            for name, index, columns in self.layers
+        }
+
+    def lookup(self, lon, lat):
+        """
+        Classify points with the flags and attributes of every land layer
+
+        Parameters
+        ----------
+            lon (array): longitudes in 'EPSG:4326'
+            lat (array): latitudes in 'EPSG:4326'
+
+        Returns
+        -------
+            result (dict): column : list of values, one per point, None where
+                a point is outside the layer
+        """
+        points = gpd.GeoDataFrame(
+            geometry=shapely.points(lon, lat),
+            crs="EPSG:4326",
+        )
+        df = enrich({"points": points}, self.layers)["points"]
+        df = pd.DataFrame(df.drop(columns=df.geometry.name))
+
+        return {col: json_values(df[col], self.dtypes.get(col, df[col].dtype)) for col in df.columns}
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """
+    HTTP/1.1 handler with keep-alive, so clients can pipeline requests on
+        one connection
+
+        GET  /health  -> {"status": "ok"}
+        GET  /layers  -> land layers and their columns
+        POST /lookup  -> {"lon": [...], "lat": [...]} or {"points": [[lon, lat], ...]}
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no host address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def send_json(self, status, body):
+        """
+        Send a JSON response
+
+        Parameters
+        ----------
+            status (int): HTTP status code
+            body (dict): JSON-serializable response
+        """
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/layers":
+            self.send_json(200, self.server.service.describe())
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        # the body is read in full so the next pipelined request starts at the right offset
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if self.path != "/lookup":
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        try:
+            request = json.loads(body)
+            if "points" in request:
+                lon, lat = zip(*request["points"]) if request["points"] else ((), ())
+            else:
+                lon, lat = request["lon"], request["lat"]
+            lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+            if lon.ndim != 1 or lon.shape != lat.shape:
+                raise ValueError("lon and lat must be lists of the same length")
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {"error": f"invalid request: {e}"})
+            return
+
+        if len(lon) > max_points:
+            self.send_json(413, {"error": f"at most {max_points} points per request"})
+            return
+
+        service = self.server.service
+        if not service.slots.acquire(timeout=service.timeout):
+            self.send_json(503, {"error": "too many concurrent lookups"})
+            return
+        try:
+            result = service.lookup(lon, lat)
+        finally:
+            service.slots.release()
+
+        self.send_json(200, result)
+
+
+class UnixLookupServer(ThreadingMixIn, UnixStreamServer):
+    """
+    Threaded HTTP server on a Unix domain socket
+    """
+
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    Create a threaded lookup server on a TCP port or a Unix socket
+
+    Parameters
+    ----------
+        service (LookupService)
+        host (str): host to bind, default '127.0.0.1'
+        port (int): port to bind, default 8765
+        socket_path (str): path of a Unix socket to bind instead, default None
+
+    Returns
+    -------
+        server (ThreadingHTTPServer or UnixLookupServer)
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixLookupServer(socket_path, LookupHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), LookupHandler)
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    server.service = service
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve land-layer lookups of lon/lat points"
+    )
+
+    # args
+    parser.add_argument(
+        "--enrich", action="append", required=True, metavar="NAME=PATH[:COLUMNS]",
+        help="land layer to keep in memory, repeatable, e.g., county=tl_county.shp:GEOID,NAME"
+    )
+    parser.add_argument(
+        "--index_dir", default=None,
+        help="path to cache a prepared spatial index of the land geoshapes for later runs"
+    )
+    parser.add_argument(
+        "--subdivide", type=int, default=0,
+        help="Split land polygons into quadtree cells of at most this many vertices, 0 tests whole polygons"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="host to bind")
+    parser.add_argument("--port", type=int, default=8765, help="port to bind")
+    parser.add_argument(
+        "--socket", default=None, help="path of a Unix socket to serve on instead of host and port"
+    )
+    parser.add_argument(
+        "--max_concurrent", type=int, default=4, help="Maximum number of lookups running at a time"
+    )
+
+    args = parser.parse_args()
+
+    max_vertices = args.subdivide if args.subdivide > 0 else None
+    layers = load_layers(args.enrich, args.index_dir, max_vertices)
+    service = LookupService(layers, args.max_concurrent)
+
+    server = make_server(service, args.host, args.port, args.socket)
+    where = args.socket if args.socket is not None else f"http://{args.host}:{args.port}"
+    print(f"Serving lookups of {', '.join(service.describe())} on {where}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
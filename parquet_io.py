@@ -0,0 +1,189 @@
+import os
+import json
+
+import geopandas as gpd
+import pyarrow.parquet as pq
+from pyproj import CRS
+
+"""Default number of rows per Parquet row group"""
+row_group_size = 100000
+
+
+def save_parquet(
+    dict,
+    save_dir,
+    geometry="source_centroid",
+    partition_col="Place_type",
+    part=None,
+    row_group_size=row_group_size,
+):
+    """
+    Save each GeoDataFrame to a GeoParquet dataset (WKB geometry) partitioned
+        by partition_col as <save_dir>/<partition_col>=<value>/<fname>.parquet
+
+    Parameters
+    ----------
+        dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS
+        save_dir (str): path of GeoParquet dataset directory
+        geometry (str): name of the geometry column to write, None keeps the active one
+        partition_col (str): column to partition by, written as the directory name
+        part (int): window number appended to the file name, default None
+        row_group_size (int): number of rows per row group with min/max statistics
+    """
+    for fname in dict:
+        gdf = dict[fname] if geometry is None else dict[fname].set_geometry(geometry)
+        name = fname if part is None else f"{fname}_part{part:05d}"
+
+        if partition_col in gdf.columns:
+            groups = gdf.groupby(partition_col, sort=False, observed=True)
+        else:
+            groups = [(None, gdf)]
+
+        for value, group in groups:
+            if value is None:
+                save_path = save_dir
+            else:
+                save_path = os.path.join(save_dir, f"{partition_col}={value}")
+                # partition value is restored from the directory name on read
+                group = group.drop(columns=partition_col)
+
+            # workers may create the same partition directory concurrently
+            os.makedirs(save_path, exist_ok=True)
+
+            group.to_parquet(
+                os.path.join(save_path, f"{name}.parquet"),
+                index=False,
+                row_group_size=row_group_size,
+                write_statistics=True,
+            )
+
+
+def read_parquet(path, columns=None, partitions=None, partition_col="Place_type"):
+    """
+    Read a GeoParquet dataset, loading only the requested columns and partitions
+
+    Parameters
+    ----------
+        path (str): path of GeoParquet file or dataset directory
+        columns (list): columns to load (include the geometry column), default None loads all
+        partitions (list): partition values to load, default None loads all
+        partition_col (str): column the dataset is partitioned by
+
+    Returns
+    -------
+        gdf (GeoDataFrame)
+    """
+    filters = None
+    if partitions is not None:
+        filters = [(partition_col, "in", list(partitions))]
+
+    return gpd.read_parquet(path, columns=columns, filters=filters)
+
+
+def geo_columns(schema):
+    """
+    Geometry columns and their CRS from the GeoParquet 'geo' metadata
+
+    Parameters
+    ----------
+        schema (pyarrow.Schema): of a GeoParquet file
+
+    Returns
+    -------
+        primary (str): name of the primary geometry column
+        crs (dict): geometry column name : CRS
+    """
+    geo = json.loads(schema.metadata[b"geo"])
+
+    crs = {}
+    for name, column in geo["columns"].items():
+        # a missing crs means OGC:CRS84, an explicit null means unknown
+        value = column.get("crs", "OGC:CRS84")
+        crs[name] = CRS.from_json_dict(value) if isinstance(value, dict) else value
+
+    return geo["primary_column"], crs
+
+
+def parquet_files(path):
+    """
+    List the files of a GeoParquet dataset
+
+    Parameters
+    ----------
+        path (str): path of GeoParquet file or dataset directory
+
+    Returns
+    -------
+        files (list): paths of .parquet files
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    return sorted(
+        os.path.join(root, name)
+        for root, dirs, names in os.walk(path)
+        for name in names
+        if name.endswith(".parquet")
+    )
+
+
+def parquet_bounds(path):
+    """
+    Bounding box of the primary geometry column of each file from the
+        GeoParquet 'geo' metadata, without reading any rows
+
+    Parameters
+    ----------
+        path (str): path of GeoParquet file or dataset directory
+
+    Returns
+    -------
+        bounds (list): (xmin, ymin, xmax, ymax, crs) per file, None for
+            files without a bbox in their metadata
+    """
+    bounds = []
+    for file in parquet_files(path):
+        schema = pq.read_schema(file)
+        primary, crs = geo_columns(schema)
+        bbox = json.loads(schema.metadata[b"geo"])["columns"][primary].get("bbox")
+        bounds.append(None if bbox is None else (*bbox, crs[primary]))
+
+    return bounds
+
+
+def iter_parquet(path, batch_size=100000, columns=None, partition_col="Place_type"):
+    """
+    Read a GeoParquet dataset in record batches so that only one batch is
+        held in memory at a time
+
+    Parameters
+    ----------
+        path (str): path of GeoParquet file or dataset directory
+        batch_size (int): maximum number of rows per batch
+        columns (list): columns to load (include the geometry column), default None loads all
+        partition_col (str): column the dataset is partitioned by
+
+    Yields
+    ------
+        value (str): partition value of the batch, None outside a partition directory
+        gdf (GeoDataFrame)
+    """
+    for file in parquet_files(path):
+        # partition value is restored from the directory name
+        directory = os.path.basename(os.path.dirname(file))
+        value = None
+        if directory.startswith(f"{partition_col}="):
+            value = directory.split("=", 1)[1]
+
+        parquet_file = pq.ParquetFile(file)
+        primary, crs = geo_columns(parquet_file.schema_arrow)
+
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            df = batch.to_pandas()
+            for name in crs:
+                if name in df.columns:
+                    df[name] = gpd.GeoSeries.from_wkb(df[name], crs=crs[name])
+            if value is not None:
+                df[partition_col] = value
+
+            yield value, gpd.GeoDataFrame(df, geometry=primary)
@@ -0,0 +1,162 @@
+import os
+import json
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from importlib.metadata import version, PackageNotFoundError
+
+"""Version of the cache table layout"""
+cache_version = 1
+
+"""Number of parse results kept in memory in front of SQLite"""
+lru_size = 100000
+
+"""Number of keys per SQLite lookup, below the limit of bound variables"""
+query_size = 500
+
+
+def normalize_address(address):
+    """
+    Cache key of an address string: upper case, single spaces and ', '
+        between components, so formatting variants share one entry
+
+    Parameters
+    ----------
+        address (str): full address string
+
+    Returns
+    -------
+        key (str)
+    """
+    components = [" ".join(part.split()) for part in str(address).upper().split(",")]
+
+    return ", ".join(part for part in components if part)
+
+
+def template_version(tag_template):
+    """
+    Version of cached parse results, a hash of the tag template, the
+        usaddress version and the cache layout
+
+    Parameters
+    ----------
+        tag_template (dict): usaddress label : component
+
+    Returns
+    -------
+        version (str)
+    """
+    try:
+        usaddress_version = version("usaddress")
+    except PackageNotFoundError:
+        usaddress_version = None
+
+    key = json.dumps([cache_version, usaddress_version, sorted(tag_template.items())])
+
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+class ParseCache:
+    """
+    Parse results of normalized address strings in a SQLite file with an
+        in-process LRU in front. Results are stored per tag template version,
+        so changing Pub28_usaddress_template or usaddress re-parses addresses.
+    """
+
+    def __init__(self, path, tag_template, max_size=lru_size):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache "
+            "(version TEXT, key TEXT, result TEXT, PRIMARY KEY (version, key))"
+        )
+        self.version = template_version(tag_template)
+        self.lru = OrderedDict()
+        self.max_size = max_size
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def remember(self, key, result):
+        """
+        Keep a result in the LRU, evicting the least recently used
+        """
+        self.lru[key] = result
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.max_size:
+            self.lru.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Look up parse results
+
+        Parameters
+        ----------
+            keys (list): normalized address strings
+
+        Returns
+        -------
+            hits (dict): key : (tags, address_type, parse_error) of cached keys
+        """
+        hits = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            if key in self.lru:
+                self.lru.move_to_end(key)
+                hits[key] = self.lru[key]
+            else:
+                missing.append(key)
+        memory_hits = len(hits)
+
+        for start in range(0, len(missing), query_size):
+            batch = missing[start : start + query_size]
+            rows = self.connection.execute(
+                f"SELECT key, result FROM parse_cache WHERE version = ? AND key IN ({', '.join('?' * len(batch))})",
+                [self.version] + batch,
+            )
+            for key, result in rows:
+                hits[key] = tuple(json.loads(result))
+                self.remember(key, hits[key])
+
+        self.stats["memory_hits"] += memory_hits
+        self.stats["disk_hits"] += len(hits) - memory_hits
+        self.stats["misses"] += len(missing) - (len(hits) - memory_hits)
+
+        return hits
+
+    def put_many(self, results):
+        """
+        Store parse results
+
+        Parameters
+        ----------
+            results (dict): key : (tags, address_type, parse_error)
+        """
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?)",
+            [(self.version, key, json.dumps(result)) for key, result in results.items()],
+        )
+        self.connection.commit()
+
+        for key, result in results.items():
+            self.remember(key, tuple(result))
+
+    def report(self):
+        """
+        Hit and miss counts of the cache
+
+        Returns
+        -------
+            report (str)
+        """
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        ratio = hits / lookups if lookups else 0.0
+
+        return (
+            f"Parse cache: {hits} hits ({self.stats['memory_hits']} in memory, "
+            f"{self.stats['disk_hits']} on disk), {self.stats['misses']} misses (hit ratio {ratio:.3f})"
+        )
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+import numpy as np
+import geopandas as gpd
+import shapely
+from pyproj import CRS, Transformer
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs, target_crs):
+    """
+    Create a pyproj Transformer once per source/target CRS pair
+
+    Parameters
+    ----------
+        source_crs (str): source CRS as WKT or authority string
+        target_crs (str): target CRS as WKT or authority string
+
+    Returns
+    -------
+        transformer (Transformer): with (x, y) / (lon, lat) axis order
+    """
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def same_crs(source_crs, target_crs):
+    """
+    Check if a transformation between two CRS is a no-op
+
+    Parameters
+    ----------
+        source_crs (CRS or str)
+        target_crs (CRS or str)
+
+    Returns
+    -------
+        (bool)
+    """
+    return CRS.from_user_input(source_crs) == CRS.from_user_input(target_crs)
+
+
+def transform_xy(x, y, source_crs, target_crs="EPSG:4326"):
+    """
+    Reproject coordinate arrays with a cached transformer
+
+    Parameters
+    ----------
+        x (array): x coordinates or longitudes
+        y (array): y coordinates or latitudes
+        source_crs (CRS or str)
+        target_crs (CRS or str): default 'EPSG:4326'
+
+    Returns
+    -------
+        x, y (array): reprojected coordinates
+    """
+    if same_crs(source_crs, target_crs):
+        return np.asarray(x), np.asarray(y)
+
+    transformer = get_transformer(
+        CRS.from_user_input(source_crs).to_wkt(), CRS.from_user_input(target_crs).to_wkt()
+    )
+
+    return transformer.transform(x, y)
+
+
+def to_crs(data, crs="EPSG:4326"):
+    """
+    Reproject a GeoDataFrame or GeoSeries with a cached transformer, skipping
+        the transformation if it is already in the target CRS
+
+    Parameters
+    ----------
+        data (GeoDataFrame or GeoSeries): with a CRS set
+        crs (CRS or str): target CRS, default 'EPSG:4326'
+
+    Returns
+    -------
+        data (GeoDataFrame or GeoSeries): in the target CRS
+    """
+    if data.crs is None:
+        raise ValueError("Cannot transform naive geometries. Please set a crs on the object first.")
+
+    target_crs = CRS.from_user_input(crs)
+    if data.crs == target_crs:
+        return data
+
+    def transform_coords(coords):
+        x, y = transform_xy(coords[:, 0], coords[:, 1], data.crs, target_crs)
+        return np.column_stack([x, y])
+
+    geometry = data.geometry if isinstance(data, gpd.GeoDataFrame) else data
+    geometry = gpd.GeoSeries(
+        shapely.transform(np.asarray(geometry.values), transform_coords),
+        index=data.index,
+        crs=target_crs,
+        name=geometry.name,
+    )
+
+    if isinstance(data, gpd.GeoSeries):
+        return geometry
+
+    data = data.copy()
+    data[geometry.name] = geometry
+
+    return data.set_crs(target_crs, allow_override=True)
@@ -0,0 +1,216 @@
+import os
+import json
+import struct
+
+from pyproj import CRS
+from pyproj.exceptions import CRSError
+
+"""ESRI Shapefile shape type codes"""
+shape_types = {
+    0: "Null",
+    1: "Point",
+    3: "PolyLine",
+    5: "Polygon",
+    8: "MultiPoint",
+    11: "PointZ",
+    13: "PolyLineZ",
+    15: "PolygonZ",
+    18: "MultiPointZ",
+    21: "PointM",
+    23: "PolyLineM",
+    25: "PolygonM",
+    28: "MultiPointM",
+    31: "MultiPatch",
+}
+
+"""dBASE field type codes"""
+dbf_field_types = {
+    "C": "str",
+    "N": "float",
+    "F": "float",
+    "L": "bool",
+    "D": "date",
+    "M": "memo",
+}
+
+
+def read_shp_header(file):
+    """
+    Read the 100-byte main file header of a .shp file without decoding geometries
+
+    Parameters
+    ----------
+        file (str): path of .shp file
+
+    Returns
+    -------
+        header (dict): geometry type and bounds (xmin, ymin, xmax, ymax)
+    """
+    with open(file, "rb") as f:
+        header = f.read(100)
+
+    file_code = struct.unpack(">i", header[0:4])[0]
+    if file_code != 9994:
+        raise ValueError(f"{file} is not an ESRI Shapefile")
+
+    shape_type = struct.unpack("<i", header[32:36])[0]
+    bounds = struct.unpack("<4d", header[36:68])
+
+    return {
+        "geometry_type": shape_types.get(shape_type, str(shape_type)),
+        "bounds": list(bounds),
+    }
+
+
+def read_shx_count(file):
+    """
+    Count features from the .shx index, which stores one 8-byte record per feature
+
+    Parameters
+    ----------
+        file (str): path of .shx file
+
+    Returns
+    -------
+        count (int): number of features
+    """
+    with open(file, "rb") as f:
+        header = f.read(100)
+
+    # file length is stored in 16-bit words
+    file_length = struct.unpack(">i", header[24:28])[0] * 2
+
+    return (file_length - 100) // 8
+
+
+def read_dbf_header(file):
+    """
+    Read record count and field descriptors from a .dbf header
+
+    Parameters
+    ----------
+        file (str): path of .dbf file
+
+    Returns
+    -------
+        count (int): number of records
+        schema (dict): field name : field type
+    """
+    with open(file, "rb") as f:
+        header = f.read(32)
+        count, header_length = struct.unpack("<IH", header[4:10])
+        descriptors = f.read(header_length - 32)
+
+    schema = {}
+    for i in range(0, len(descriptors), 32):
+        field = descriptors[i : i + 32]
+        # field descriptor array is terminated by 0x0D
+        if len(field) < 32 or field[0] == 0x0D:
+            break
+        name = field[:11].split(b"\x00")[0].decode("latin-1")
+        field_type = chr(field[11])
+        schema[name] = dbf_field_types.get(field_type, field_type)
+
+    return count, schema
+
+
+def read_prj(file):
+    """
+    Read the coordinate reference system of a .prj file
+
+    Parameters
+    ----------
+        file (str): path of .prj file
+
+    Returns
+    -------
+        crs (str): 'EPSG:<code>' if it can be resolved, otherwise the WKT string
+    """
+    with open(file, "r") as f:
+        wkt = f.read().strip()
+
+    try:
+        epsg = CRS.from_wkt(wkt).to_epsg()
+    except CRSError:
+        epsg = None
+
+    return f"EPSG:{epsg}" if epsg else wkt
+
+
+def shp_metadata(file):
+    """
+    Collect feature count, CRS, bounds, geometry type and attribute schema of
+        a shapefile from its .shp/.shx/.dbf/.prj headers
+
+    Parameters
+    ----------
+        file (str): path of .shp file
+
+    Returns
+    -------
+        metadata (dict)
+    """
+    stem = os.path.splitext(file)[0]
+    stat = os.stat(file)
+
+    metadata = {
+        "path": file,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "feature_count": None,
+        "crs": None,
+        "schema": {},
+    }
+    metadata.update(read_shp_header(file))
+
+    if os.path.exists(stem + ".dbf"):
+        metadata["feature_count"], metadata["schema"] = read_dbf_header(stem + ".dbf")
+    elif os.path.exists(stem + ".shx"):
+        metadata["feature_count"] = read_shx_count(stem + ".shx")
+
+    if os.path.exists(stem + ".prj"):
+        metadata["crs"] = read_prj(stem + ".prj")
+
+    return metadata
+
+
+def build_catalog(shp_files, manifest_path=None):
+    """
+    Catalog geoshape files and cache the results in a JSON manifest.
+        Entries whose size and modification time are unchanged are reused.
+
+    Parameters
+    ----------
+        shp_files (list): paths of .shp files
+        manifest_path (str): path of JSON manifest, default None does not cache
+
+    Returns
+    -------
+        catalog (dict): file name : metadata
+    """
+    cached = {}
+    if manifest_path is not None and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            cached = json.load(f)
+
+    catalog = {}
+    for file in shp_files:
+        fname = os.path.basename(file).split(".")[0]
+        stat = os.stat(file)
+
+        entry = cached.get(fname)
+        if (
+            entry is not None
+            and entry["path"] == file
+            and entry["size"] == stat.st_size
+            and entry["mtime"] == stat.st_mtime
+        ):
+            catalog[fname] = entry
+        else:
+            catalog[fname] = shp_metadata(file)
+
+    if manifest_path is not None:
+        with open(manifest_path, "w") as f:
+            json.dump(catalog, f, indent=2)
+
+    return catalog
@@ -0,0 +1,776 @@
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import CRS
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+from reproject import to_crs
+from build_cache import file_fingerprint
+from instrumentation import metrics
+
+"""Version of the on-disk index layout"""
+index_version = 2
+
+"""Maximum quadtree depth when subdividing complex polygons"""
+max_depth = 12
+
+"""Minimum number of points per partition of a parallel query"""
+min_partition_size = 10000
+
+"""Partitions per worker, so that dense partitions do not leave workers idle"""
+partitions_per_worker = 4
+
+
+def morton_code(x, y, bounds, bits=16):
+    """
+    Z-order (Morton) code of coordinates on a 2^bits x 2^bits grid over bounds
+
+    Parameters
+    ----------
+        x, y (array): coordinates
+        bounds (tuple): xmin, ymin, xmax, ymax of the grid
+        bits (int): bits per axis
+
+    Returns
+    -------
+        code (array): uint64 codes, nearby coordinates have nearby codes
+    """
+    xmin, ymin, xmax, ymax = bounds
+    scale = (1 << bits) - 1
+
+    def spread(v, vmin, vmax):
+        span = vmax - vmin if vmax > vmin else 1.0
+        v = ((v - vmin) / span * scale).astype(np.uint64)
+        # interleave zero bits between the bits of v
+        v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+        v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+        v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+        return v
+
+    return spread(x, xmin, xmax) | (spread(y, ymin, ymax) << np.uint64(1))
+
+
+def read_land(files, mask=None):
+    """
+    Read land geoshape files, only the features intersecting mask if given.
+        Features are indexed by their position in the files, so land
+        identifiers (e.g., 'index_right') are the same with or without mask.
+
+    Parameters
+    ----------
+        files (list): paths of land geoshape files
+        mask (GeoSeries): areas to read, reprojected to the CRS of each file, default None
+
+    Returns
+    -------
+        gdf (GeoDataFrame)
+    """
+    # without pyogrio, a masked read cannot tell the feature positions
+    if mask is not None and pyogrio is None:
+        print("pyogrio is not installed, reading the whole land files instead of the masked features.")
+        mask = None
+
+    frames = []
+    offset = 0
+    for file in files:
+        if mask is None:
+            df = gpd.read_file(file)
+            n_features = len(df)
+            df.index = pd.RangeIndex(offset, offset + n_features)
+        else:
+            # shapefile FIDs are the 0-based feature positions
+            df = gpd.read_file(file, mask=mask, engine="pyogrio", fid_as_index=True)
+            n_features = pyogrio.read_info(file)["features"]
+            df.index = pd.Index(df.index.to_numpy(dtype=np.int64) + offset)
+        frames.append(df)
+        offset += n_features
+
+    return pd.concat(frames)
+
+
+def unique_points(points):
+    """
+    Distinct coordinates of an array of points
+
+    Parameters
+    ----------
+        points (array): shapely Points
+
+    Returns
+    -------
+        first (array): position of the first point of each distinct coordinate
+        inverse (array): distinct coordinate of each point, as a position in first
+    """
+    xy = pd.DataFrame({"x": shapely.get_x(points), "y": shapely.get_y(points)})
+    inverse = xy.groupby(["x", "y"], sort=False, dropna=False).ngroup().to_numpy()
+    _, first = np.unique(inverse, return_index=True)
+
+    return first, inverse
+
+
+def broadcast(inverse, idx):
+    """
+    Expand results of the distinct coordinates to every point with that
+        coordinate
+
+    Parameters
+    ----------
+        inverse (array): from unique_points
+        idx (array): distinct coordinate of each result row, as a position in first
+
+    Returns
+    -------
+        point_idx (array): point of each expanded row, in point order
+        row_idx (array): result row of each expanded row
+    """
+    # points grouped by their distinct coordinate
+    order = np.argsort(inverse, kind="stable")
+    counts = np.bincount(inverse, minlength=len(order))
+    starts = np.cumsum(counts) - counts
+
+    repeats = counts[idx]
+    row_idx = np.repeat(np.arange(len(idx)), repeats)
+    offset = np.arange(len(row_idx)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    point_idx = order[starts[idx][row_idx] + offset]
+
+    # stable, so rows of a point keep their order
+    order = np.argsort(point_idx, kind="stable")
+
+    return point_idx[order], row_idx[order]
+
+
+def dedup_points(points):
+    """
+    Distinct coordinates of points to join, recorded as the 'dedup' stage
+        with the number of points in and distinct coordinates out
+
+    Parameters
+    ----------
+        points (array): shapely geometries
+
+    Returns
+    -------
+        first, inverse (array): from unique_points, None if the geometries are
+            not all points or all coordinates are distinct
+    """
+    if len(points) == 0 or not (shapely.get_type_id(points) == 0).all():
+        return None, None
+
+    # recorded without a nested stage, which would start a second profiler
+    # inside the caller's stage
+    start = time.perf_counter()
+    first, inverse = unique_points(points)
+    metrics.add("dedup", time.perf_counter() - start, len(points), len(first))
+
+    if len(first) == len(points):
+        return None, None
+
+    return first, inverse
+
+
+def as_array(geometry):
+    """
+    Geometry, array or GeoSeries as a 1-D array of shapely geometries
+    """
+    return np.atleast_1d(np.asarray(geometry, dtype=object))
+
+
+def query_partition(index, x, y, predicate="intersects"):
+    """
+    Query a partition of points against the land polygons that overlap it,
+        run in a worker process
+
+    Parameters
+    ----------
+        index (LandIndex): subset of the land index
+        x, y (array): coordinates of the points in the index CRS
+        predicate (str): shapely binary predicate
+
+    Returns
+    -------
+        point_idx, polygon_idx (array): positions within the partition and subset
+    """
+    return index.query(shapely.points(x, y), predicate, dedup=False)
+
+
+def subdivide(geometries, max_vertices=64, max_depth=max_depth):
+    """
+    Recursively split polygons with more than max_vertices vertices into
+        quadtree cells. Cells fully inside their polygon are kept as interior
+        cells; cells on the polygon boundary keep the clipped piece of the
+        polygon. Cells outside the polygon are dropped.
+
+    Parameters
+    ----------
+        geometries (array): land polygons
+        max_vertices (int): maximum number of vertices of a boundary piece
+        max_depth (int): maximum number of quadtree levels
+
+    Returns
+    -------
+        polygon (array): position of the source polygon of each cell
+        pieces (array): clipped polygon piece of each cell, the cell box for interior cells
+        interior (array): True for cells fully inside their polygon
+    """
+    n_coords = shapely.get_num_coordinates(geometries)
+    # invalid polygons cannot be clipped robustly and are tested whole
+    split = (n_coords > max_vertices) & shapely.is_valid(geometries)
+
+    simple = np.flatnonzero(~split)
+    polygon, pieces, interior = [simple], [geometries[simple]], [np.zeros(len(simple), dtype=bool)]
+
+    shapely.prepare(geometries)
+
+    # each cell keeps the piece of its parent, which is cheaper to clip than the polygon
+    cell_polygon = np.flatnonzero(split)
+    cell_geometry = geometries[cell_polygon]
+    cell_bounds = shapely.bounds(cell_geometry)
+    for depth in range(max_depth + 1):
+        if len(cell_polygon) == 0:
+            break
+
+        # interior test against the whole prepared polygon, as clipped pieces may be invalid
+        boxes = shapely.box(cell_bounds[:, 0], cell_bounds[:, 1], cell_bounds[:, 2], cell_bounds[:, 3])
+        inside = shapely.contains(geometries[cell_polygon], boxes)
+        polygon.append(cell_polygon[inside])
+        pieces.append(boxes[inside])
+        interior.append(np.ones(inside.sum(), dtype=bool))
+
+        cell_polygon, cell_bounds = cell_polygon[~inside], cell_bounds[~inside]
+        clipped = np.array(
+            [
+                shapely.clip_by_rect(geometry, *bounds)
+                for geometry, bounds in zip(cell_geometry[~inside], cell_bounds)
+            ],
+            dtype=object,
+        )
+
+        keep = ~shapely.is_empty(clipped)
+        cell_polygon, cell_bounds, clipped = cell_polygon[keep], cell_bounds[keep], clipped[keep]
+
+        leaf = (shapely.get_num_coordinates(clipped) <= max_vertices) | (depth == max_depth)
+        polygon.append(cell_polygon[leaf])
+        pieces.append(clipped[leaf])
+        interior.append(np.zeros(leaf.sum(), dtype=bool))
+
+        # split the remaining cells into quadrants
+        cell_polygon, cell_bounds, clipped = cell_polygon[~leaf], cell_bounds[~leaf], clipped[~leaf]
+        xmin, ymin, xmax, ymax = cell_bounds.T
+        xmid, ymid = (xmin + xmax) / 2, (ymin + ymax) / 2
+        cell_bounds = np.concatenate(
+            [
+                np.column_stack([xmin, ymin, xmid, ymid]),
+                np.column_stack([xmid, ymin, xmax, ymid]),
+                np.column_stack([xmin, ymid, xmid, ymax]),
+                np.column_stack([xmid, ymid, xmax, ymax]),
+            ]
+        )
+        cell_polygon = np.tile(cell_polygon, 4)
+        cell_geometry = np.tile(clipped, 4)
+
+    return np.concatenate(polygon), np.concatenate(pieces), np.concatenate(interior)
+
+
+class LandIndex:
+    """
+    Prepared polygon index of a land layer (tribal, rural, tracts, ZCTAs, ...).
+        Geometries are stored pre-reprojected as WKB and decoded and prepared
+        on first use; the R-tree is packed from the stored bounds.
+    """
+
+    def __init__(self, wkb, offsets, bounds, attributes, crs, cells=None):
+        self.cells = cells
+        self.wkb = wkb
+        self.offsets = offsets
+        self.bounds = bounds
+        self.attributes = attributes
+        self.crs = CRS.from_user_input(crs)
+
+        self.geometries = np.full(len(bounds), None, dtype=object)
+        self.tree = shapely.STRtree(
+            shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+        )
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def __reduce__(self):
+        # pickle the WKB and bounds for worker processes, the tree is rebuilt on load
+        return (
+            LandIndex,
+            (
+                np.asarray(self.wkb),
+                np.asarray(self.offsets),
+                np.asarray(self.bounds),
+                self.attributes,
+                self.crs.to_wkt(),
+                self.cells,
+            ),
+        )
+
+    def subset(self, idx, extent=None):
+        """
+        Index of the polygons at the given positions
+
+        Parameters
+        ----------
+            idx (array): sorted polygon positions
+            extent (Polygon or array): keep only the quadtree cells overlapping extent, default None
+
+        Returns
+        -------
+            index (LandIndex): with polygon positions renumbered 0..len(idx)-1,
+                the attributes keep the land index
+        """
+        starts = np.asarray(self.offsets[idx])
+        lengths = np.asarray(self.offsets[idx + 1]) - starts
+        offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(lengths)
+        # gather the WKB bytes of each polygon into one contiguous buffer
+        buffer = np.asarray(self.wkb[np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths)])
+
+        cells = None
+        if self.cells is not None:
+            cell_idx = np.flatnonzero(np.isin(self.cells.attributes["polygon"].to_numpy(), idx))
+            if extent is not None:
+                cell_idx = np.intersect1d(cell_idx, self.cells.tree.query(as_array(extent))[1])
+            cells = self.cells.subset(cell_idx)
+            cells.attributes["polygon"] = np.searchsorted(idx, cells.attributes["polygon"].to_numpy())
+
+        return LandIndex(
+            buffer,
+            offsets,
+            np.asarray(self.bounds)[idx],
+            self.attributes.iloc[idx],
+            self.crs,
+            cells,
+        )
+
+    @classmethod
+    def from_gdf(cls, gdf, crs="EPSG:4326", max_vertices=None):
+        """
+        Build an index from a land GeoDataFrame
+
+        Parameters
+        ----------
+            gdf (GeoDataFrame): land shapes in any CRS
+            crs (str): CRS of the index, default 'EPSG:4326'
+            max_vertices (int): subdivide polygons into quadtree cells of at
+                most max_vertices vertices, default None does not subdivide
+
+        Returns
+        -------
+            index (LandIndex)
+        """
+        gdf = to_crs(gdf, crs)
+        geometries = np.asarray(gdf.geometry.values)
+        # null geometries become empty polygons: NaN bounds keep them out of the tree
+        geometries = np.where(shapely.is_missing(geometries), shapely.from_wkt("POLYGON EMPTY"), geometries)
+
+        cells = None
+        if max_vertices is not None:
+            polygon, pieces, interior = subdivide(geometries, max_vertices)
+            cells = cls.from_gdf(
+                gpd.GeoDataFrame({"polygon": polygon, "interior": interior}, geometry=pieces, crs=crs),
+                crs,
+            )
+
+        wkb = shapely.to_wkb(geometries)
+        offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in wkb])
+        buffer = np.frombuffer(b"".join(wkb), dtype=np.uint8)
+
+        attributes = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        index = cls(buffer, offsets, shapely.bounds(geometries), attributes, crs, cells)
+
+        shapely.prepare(geometries)
+        index.geometries[:] = geometries
+
+        return index
+
+    def save(self, index_dir, source=None, max_vertices=None):
+        """
+        Serialize the index to a directory
+
+        Parameters
+        ----------
+            index_dir (str): directory to save to
+            source (dict): fingerprints of the source files, default None
+            max_vertices (int): subdivision the cells were built with, default None
+        """
+        os.makedirs(index_dir, exist_ok=True)
+
+        np.save(os.path.join(index_dir, "wkb.npy"), self.wkb)
+        np.save(os.path.join(index_dir, "offsets.npy"), self.offsets)
+        np.save(os.path.join(index_dir, "bounds.npy"), self.bounds)
+        self.attributes.to_pickle(os.path.join(index_dir, "attributes.pkl"))
+
+        if self.cells is not None:
+            self.cells.save(os.path.join(index_dir, "cells"))
+
+        with open(os.path.join(index_dir, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "version": index_version,
+                    "crs": self.crs.to_wkt(),
+                    "max_vertices": max_vertices,
+                    "source": source,
+                },
+                f,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, index_dir):
+        """
+        Load a serialized index with the WKB, offsets and bounds memory-mapped
+
+        Parameters
+        ----------
+            index_dir (str): directory the index was saved to
+
+        Returns
+        -------
+            index (LandIndex)
+        """
+        with open(os.path.join(index_dir, "meta.json"), "r") as f:
+            meta = json.load(f)
+
+        cells = None
+        if os.path.isdir(os.path.join(index_dir, "cells")):
+            cells = cls.load(os.path.join(index_dir, "cells"))
+
+        return cls(
+            np.load(os.path.join(index_dir, "wkb.npy"), mmap_mode="r"),
+            np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r"),
+            np.load(os.path.join(index_dir, "bounds.npy"), mmap_mode="r"),
+            pd.read_pickle(os.path.join(index_dir, "attributes.pkl")),
+            meta["crs"],
+            cells,
+        )
+
+    def clip(self, extent):
+        """
+        Index of only the polygons whose bounds intersect extent
+
+        Parameters
+        ----------
+            extent (GeoSeries): areas to keep, e.g., the boxes around the centroids
+
+        Returns
+        -------
+            index (LandIndex)
+        """
+        extent = as_array(to_crs(extent, self.crs).values)
+        idx = np.unique(self.tree.query(extent)[1])
+
+        return self.subset(idx, extent)
+
+    def get_geometries(self, idx):
+        """
+        Decode and prepare the polygons at the given positions on first use
+
+        Parameters
+        ----------
+            idx (array): polygon positions
+
+        Returns
+        -------
+            geometries (array): prepared shapely geometries
+        """
+        missing = idx[shapely.is_missing(self.geometries[idx])]
+        if len(missing):
+            missing = np.unique(missing)
+            wkb = [
+                self.wkb[self.offsets[i] : self.offsets[i + 1]].tobytes() for i in missing
+            ]
+            geometries = shapely.from_wkb(wkb)
+            shapely.prepare(geometries)
+            self.geometries[missing] = geometries
+
+        return self.geometries[idx]
+
+    def attributes_at(self, polygon_idx, columns=None, index_name=None):
+        """
+        Land attributes at the given polygon positions, NaN where the
+            position is -1 (no match)
+
+        Parameters
+        ----------
+            polygon_idx (array): polygon positions or -1
+            columns (list): attribute columns to keep, default None keeps all
+            index_name (str): name of a column holding the land index, default None drops it
+
+        Returns
+        -------
+            df (DataFrame): one row per position with a RangeIndex
+        """
+        attributes = self.attributes if columns is None else self.attributes[columns]
+        df = attributes.iloc[np.maximum(polygon_idx, 0)]
+        df = df.reset_index(names=index_name) if index_name else df.reset_index(drop=True)
+
+        return df.where(np.repeat(polygon_idx[:, None] >= 0, df.shape[1], axis=1))
+
+    def first_match(self, points, predicate="intersects", workers=1, dedup=True, executor=None):
+        """
+        Position of the first polygon (in layer order) each point satisfies
+            the predicate with
+
+        Parameters
+        ----------
+            points (GeoSeries or array): points, reprojected to the index CRS if a GeoSeries
+            predicate (str): shapely binary predicate, default 'intersects'
+            workers (int): number of worker processes, default 1
+            dedup (bool): query each distinct coordinate once, default True
+            executor (ProcessPoolExecutor): worker pool shared by the run, default None
+                starts a pool for this call
+
+        Returns
+        -------
+            polygon_idx (array): polygon position per point, -1 if none
+        """
+        point_idx, polygon_idx = self.query(points, predicate, workers, dedup, executor)
+
+        first = np.full(len(points), len(self), dtype=np.int64)
+        np.minimum.at(first, point_idx, polygon_idx)
+        first[first == len(self)] = -1
+
+        return first
+
+    def query(self, points, predicate="intersects", workers=1, dedup=True, executor=None):
+        """
+        Find the polygons each point satisfies the predicate with
+
+        Parameters
+        ----------
+            points (GeoSeries or array): points, reprojected to the index CRS if a GeoSeries
+            predicate (str): shapely binary predicate, default 'intersects'
+            workers (int): number of worker processes, default 1
+            dedup (bool): query each distinct coordinate once and broadcast
+                the matches to every point with that coordinate, default True
+            executor (ProcessPoolExecutor): worker pool shared by the run, default None
+                starts a pool for this call
+
+        Returns
+        -------
+            point_idx, polygon_idx (array): positions of matching pairs
+        """
+        if isinstance(points, gpd.GeoSeries):
+            points = np.asarray(to_crs(points, self.crs).values)
+
+        if dedup:
+            first, inverse = dedup_points(points)
+            if first is not None:
+                point_idx, polygon_idx = self.query(points[first], predicate, workers, dedup=False, executor=executor)
+                point_idx, row_idx = broadcast(inverse, point_idx)
+                return point_idx, polygon_idx[row_idx]
+
+        if workers > 1 and len(points) >= 2 * min_partition_size:
+            return self.parallel_query(points, predicate, workers, executor)
+
+        if self.cells is not None and predicate == "intersects":
+            return self.query_cells(points)
+
+        # bounding box candidates from the packed R-tree, then exact tests
+        point_idx, polygon_idx = self.tree.query(points)
+        if len(point_idx) == 0:
+            return point_idx, polygon_idx
+
+        polygons = self.get_geometries(polygon_idx)
+        keep = getattr(shapely, predicate)(polygons, points[point_idx])
+
+        return point_idx[keep], polygon_idx[keep]
+
+    def parallel_query(self, points, predicate="intersects", workers=2, executor=None):
+        """
+        Query centroids in parallel. Points are ordered along a Z-order curve
+            and split into compact partitions of equal size; each worker
+            receives one partition and only the land polygons overlapping its
+            extent. Pairs are merged back in the original point order.
+
+        Parameters
+        ----------
+            points (array): shapely Points in the index CRS
+            predicate (str): shapely binary predicate, default 'intersects'
+            workers (int): number of worker processes
+            executor (ProcessPoolExecutor): worker pool shared by the run, default None
+                starts a pool for this call
+
+        Returns
+        -------
+            point_idx, polygon_idx (array): positions of matching pairs
+        """
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return self.parallel_query(points, predicate, workers, executor)
+
+        # points are sent to the workers as coordinate arrays
+        x, y = shapely.get_x(points), shapely.get_y(points)
+        order = np.argsort(morton_code(x, y, (np.nanmin(x), np.nanmin(y), np.nanmax(x), np.nanmax(y))), kind="stable")
+
+        n_partitions = min(workers * partitions_per_worker, len(points) // min_partition_size)
+        partitions = np.array_split(order, n_partitions)
+
+        subsets, xs, ys, polygons = [], [], [], []
+        for partition in partitions:
+            px, py = x[partition], y[partition]
+            extent = shapely.box(np.nanmin(px), np.nanmin(py), np.nanmax(px), np.nanmax(py))
+            idx = np.sort(self.tree.query(extent))
+            subsets.append(self.subset(idx, extent))
+            xs.append(px)
+            ys.append(py)
+            polygons.append(idx)
+
+        point_idx, polygon_idx = [], []
+        results = executor.map(query_partition, subsets, xs, ys, [predicate] * len(subsets))
+        for partition, idx, (local_point, local_polygon) in zip(partitions, polygons, results):
+            point_idx.append(partition[local_point])
+            polygon_idx.append(idx[local_polygon])
+
+        point_idx, polygon_idx = np.concatenate(point_idx), np.concatenate(polygon_idx)
+        order = np.lexsort((polygon_idx, point_idx))
+
+        return point_idx[order], polygon_idx[order]
+
+    def query_cells(self, points):
+        """
+        Find the polygons each point intersects through the quadtree cells.
+            Points in interior cells match without an exact test; only points
+            in boundary cells are tested against the clipped polygon piece.
+
+        Parameters
+        ----------
+            points (array): points in the index CRS
+
+        Returns
+        -------
+            point_idx, polygon_idx (array): positions of matching pairs
+        """
+        point_idx, cell_idx = self.cells.tree.query(points)
+
+        keep = self.cells.attributes["interior"].to_numpy()[cell_idx]
+        boundary = np.flatnonzero(~keep)
+        if len(boundary):
+            pieces = self.cells.get_geometries(cell_idx[boundary])
+            keep[boundary] = shapely.intersects(pieces, points[point_idx[boundary]])
+
+        point_idx = point_idx[keep]
+        polygon_idx = self.cells.attributes["polygon"].to_numpy()[cell_idx[keep]]
+
+        # points on shared cell edges match the same polygon more than once,
+        # only points with several matching cells need deduplicating
+        repeated = np.bincount(point_idx, minlength=len(points))[point_idx] > 1
+        pairs = np.unique(point_idx[repeated] * len(self) + polygon_idx[repeated])
+
+        return (
+            np.concatenate([point_idx[~repeated], pairs // len(self)]),
+            np.concatenate([polygon_idx[~repeated], pairs % len(self)]),
+        )
+
+    def sjoin(self, gdf, how="left", predicate="intersects", workers=1, executor=None):
+        """
+        Spatial join points to the indexed polygons, equivalent to
+            GeoDataFrame.sjoin with the land layer on the right
+
+        Parameters
+        ----------
+            gdf (GeoDataFrame): points
+            how (str): 'left' or 'inner'
+            predicate (str): shapely binary predicate, default 'intersects'
+            workers (int): number of worker processes, default 1
+            executor (ProcessPoolExecutor): worker pool shared by the run, default None
+                starts a pool for this call
+
+        Returns
+        -------
+            df (GeoDataFrame): one row per matching pair, with 'index_right'
+                and the land attributes
+        """
+        point_idx, polygon_idx = self.query(gdf.geometry, predicate, workers, executor=executor)
+
+        if how == "left":
+            matched = np.zeros(len(gdf), dtype=bool)
+            matched[point_idx] = True
+            unmatched = np.flatnonzero(~matched)
+            point_idx = np.concatenate([point_idx, unmatched])
+            polygon_idx = np.concatenate([polygon_idx, np.full(len(unmatched), -1)])
+
+        order = np.lexsort((polygon_idx, point_idx))
+        point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+
+        right = self.attributes_at(polygon_idx, index_name="index_right")
+        # suffix overlapping column names like GeoDataFrame.sjoin
+        overlap = set(gdf.columns) & set(right.columns) - {gdf.geometry.name}
+        left = gdf.iloc[point_idx].rename(columns={col: f"{col}_left" for col in overlap})
+        right = right.rename(columns={col: f"{col}_right" for col in overlap})
+        right.index = left.index
+
+        return pd.concat([left, right], axis=1)
+
+
+def build_land_index(files, index_dir=None, crs="EPSG:4326", max_vertices=None, mask=None):
+    """
+    Load the prepared index of a land layer, building and caching it when the
+        source files changed
+
+    Parameters
+    ----------
+        files (list): paths of land geoshape files
+        index_dir (str): directory of the cached index, default None does not cache
+        crs (str): CRS of the index, default 'EPSG:4326'
+        max_vertices (int): subdivide polygons into quadtree cells of at
+            most max_vertices vertices, default None does not subdivide
+        mask (GeoSeries): keep only the land features intersecting mask,
+            read from the files or queried from the cached index, default None
+
+    Returns
+    -------
+        index (LandIndex)
+    """
+    meta_path = None if index_dir is None else os.path.join(index_dir, "meta.json")
+
+    cached = None
+    if meta_path is not None and os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            cached = json.load(f)
+
+    source = {}
+    for file in files:
+        previous = None
+        if cached is not None and cached["source"] is not None:
+            previous = cached["source"].get(file)
+        source[file] = file_fingerprint(file, previous)
+
+    if (
+        cached is not None
+        and cached["version"] == index_version
+        and cached["source"] == source
+        and cached["max_vertices"] == max_vertices
+        and CRS.from_user_input(cached["crs"]) == CRS.from_user_input(crs)
+    ):
+        index = LandIndex.load(index_dir)
+        return index if mask is None else index.clip(mask)
+
+    if index_dir is None:
+        return LandIndex.from_gdf(read_land(files, mask), crs, max_vertices)
+
+    # the cached index covers the whole land layer for later runs
+    index = LandIndex.from_gdf(read_land(files), crs, max_vertices)
+
+    # drop the cells of a previous build
+    shutil.rmtree(os.path.join(index_dir, "cells"), ignore_errors=True)
+    index.save(index_dir, source, max_vertices)
+
+    return index if mask is None else index.clip(mask)
@@ -6,8 +6,17 @@ import csv
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from parquet_io import save_parquet, read_parquet, iter_parquet, parquet_bounds
+from reproject import to_crs
+from shp_catalog import shp_metadata
+from spatial_index import LandIndex, build_land_index, read_land, dedup_points, broadcast
+from join_summary import JoinSummary
+from instrumentation import metrics, add_metrics_args, start_metrics
 
 def read_shp(file, rows=100):
     """
@@ -25,6 +34,68 @@ def read_shp(file, rows=100):
 
     return df
 
+def iter_shp(file, batch_size=100000, rows=None):
+    """
+    Read geoshapes file in batches so that only one batch is held in memory
+
+    Parameters
+    ----------
+        file (str): path of geoshape file
+        batch_size (int): number of features per batch
+        rows (int): total number of rows to read, default None reads all rows
+
+    Yields
+    ------
+        df (GeoDataFrame): with index offset to the feature position in the file
+    """
+    start = 0
+    while rows is None or start < rows:
+        stop = start + batch_size if rows is None else min(start + batch_size, rows)
+        with metrics.stage('read_centroids') as m:
+            df = gpd.read_file(file, rows=slice(start, stop))
+            m['rows_out'] = len(df)
+        if df.empty:
+            break
+
+        df.index = pd.RangeIndex(start, start + len(df))
+        yield df
+
+        # short batch means the end of the file was reached
+        if len(df) < stop - start:
+            break
+        start = stop
+
+def iter_centroids(data_dir, batch_size=100000, rows=None):
+    """
+    Read centroids in batches from geoshape files or a GeoParquet dataset
+
+    Parameters
+    ----------
+        data_dir (str): path of geoshape files or GeoParquet dataset
+        batch_size (int): number of centroids per batch
+        rows (int): number of rows per dataset to read, default None reads all rows
+
+    Yields
+    ------
+        fname (str): name of the dataset
+        df (GeoDataFrame): batch of centroids
+    """
+    if data_dir.endswith('.parquet'):
+        read = {}
+        for fname, df in iter_parquet(data_dir, batch_size):
+            fname = str(fname)
+            if rows is not None:
+                df = df.head(rows - read.get(fname, 0))
+                if df.empty:
+                    continue
+            read[fname] = read.get(fname, 0) + len(df)
+            yield fname, df
+
+    for file in list_shp(data_dir):
+        fname = os.path.basename(file).split('.')[0]
+        for df in iter_shp(file, batch_size, rows):
+            yield fname, df
+
 def convert_EPSG4326(dict):
     """
     Convert each GeoDataFrame to 'EPSG:4326'
@@ -38,43 +109,311 @@ def convert_EPSG4326(dict):
         dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS
     """
     for fname in dict:
-        dict[fname] = dict[fname].to_crs("EPSG:4326")
+        dict[fname] = to_crs(dict[fname], "EPSG:4326")
 
     return dict
 
-def spatial_join(dict, gdf, filetype, how='left'):
+"""Padding of the centroid extent boxes in degrees, so that reprojecting the
+boxes to the CRS of a land file cannot cut off centroids on their edges"""
+extent_padding = 0.01
+
+def extent_boxes(bounds):
+    """
+    Padded boxes in 'EPSG:4326', densified to keep their shape when reprojected
+
+    Parameters
+    ----------
+        bounds (array): xmin, ymin, xmax, ymax per box in 'EPSG:4326'
+
+    Returns
+    -------
+        mask (GeoSeries)
+    """
+    boxes = shapely.box(
+        bounds[:, 0] - extent_padding, bounds[:, 1] - extent_padding,
+        bounds[:, 2] + extent_padding, bounds[:, 3] + extent_padding
+    )
+
+    return gpd.GeoSeries(shapely.segmentize(boxes, 0.25), crs="EPSG:4326")
+
+def point_extent(dict, cell_size=1.0, by=None):
+    """
+    Area covered by the centroids, as the bounding box of each group of the
+        'by' column (e.g., state) or else the boxes of the occupied grid cells
+
+    Parameters
+    ----------
+        dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS
+        cell_size (float): size of the grid cells in degrees, default 1.0
+        by (str): column to group the centroids by, default None
+
+    Returns
+    -------
+        mask (GeoSeries): boxes in 'EPSG:4326', None if there are no centroids
+    """
+    bounds = []
+    for fname in dict:
+        xy = pd.DataFrame({'x': dict[fname].geometry.x.values, 'y': dict[fname].geometry.y.values})
+        valid = xy.notna().all(axis=1).values
+
+        if by is not None and by in dict[fname].columns:
+            groups = xy[valid].groupby(dict[fname][by].values[valid], dropna=False)
+            bounds.append(np.column_stack([groups.x.min(), groups.y.min(), groups.x.max(), groups.y.max()]))
+        else:
+            cells = np.unique(np.floor(xy.values[valid] / cell_size), axis=0)
+            bounds.append(np.column_stack([cells * cell_size, (cells + 1) * cell_size]))
+
+    if not bounds or sum(len(b) for b in bounds) == 0:
+        return None
+
+    return extent_boxes(np.unique(np.concatenate(bounds), axis=0))
+
+def file_extent(data_dir):
+    """
+    Bounding box of each centroid file from the geoshape file headers or the
+        GeoParquet metadata, without reading any centroids
+
+    Parameters
+    ----------
+        data_dir (str): path of geoshape files or GeoParquet dataset
+
+    Returns
+    -------
+        mask (GeoSeries): boxes in 'EPSG:4326', None if a file has no bounds or CRS
+    """
+    if data_dir.endswith('.parquet'):
+        bounds = parquet_bounds(data_dir)
+    else:
+        bounds = []
+        for file in list_shp(data_dir):
+            metadata = shp_metadata(file)
+            bounds.append((*metadata['bounds'], metadata['crs']))
+
+    if not bounds or any(b is None or b[4] is None for b in bounds):
+        return None
+
+    boxes = []
+    for xmin, ymin, xmax, ymax, crs in bounds:
+        box = shapely.box(xmin, ymin, xmax, ymax)
+        box = shapely.segmentize(box, max(xmax - xmin, ymax - ymin, 1e-9) / 16)
+        boxes.append(to_crs(gpd.GeoSeries([box], crs=crs), "EPSG:4326").total_bounds)
+
+    return extent_boxes(np.array(boxes))
+
+"""Flag column of each land type"""
+land_flags = {'tribal': 'Tribal', 'rural': 'Rural', 'other': 'Other'}
+
+def match_pairs(points, gdf, predicate='intersects', workers=1, executor=None):
+    """
+    Find the land polygons each centroid falls in
+
+    Parameters
+    ----------
+        points (GeoDataFrame): centroids
+        gdf (GeoDataFrame or LandIndex): of land shapes in any CRS
+        predicate (str): shapely binary predicate, default 'intersects'
+        workers (int): number of worker processes for a LandIndex, default 1
+        executor (ProcessPoolExecutor): worker pool shared by the run, default None
+
+    Returns
+    -------
+        point_idx, polygon_idx (array): positions of matching pairs
+    """
+    if isinstance(gdf, LandIndex):
+        return gdf.query(points.geometry, predicate, workers, executor=executor)
+
+    geometry = np.asarray(to_crs(points.geometry, gdf.crs).values)
+
+    # query each distinct coordinate once
+    first, inverse = dedup_points(geometry)
+    if first is None:
+        return gdf.sindex.query(geometry, predicate=predicate)
+
+    point_idx, polygon_idx = gdf.sindex.query(geometry[first], predicate=predicate)
+    point_idx, row_idx = broadcast(inverse, point_idx)
+
+    return point_idx, polygon_idx[row_idx]
+
+def spatial_join(dict, gdf, filetype, how='left', join_mode='rows', match_ids=False, workers=1, executor=None):
     """
     Spatial join centroids to geoshape file
 
     Parameters
     ----------
         dict (dictionary): of GeoDataFrames
-        gdf (GeoDataFrame): of land shapes
-        filetype (str): from args.filetype ('tribal' or 'rural')
+        gdf (GeoDataFrame or LandIndex): of land shapes in any CRS
+        filetype (str): from args.filetype ('tribal', 'rural' or 'other')
         how (parameter): sjoin parameter, default = 'left'
+        join_mode (str): 'rows' for one row per matching polygon like sjoin,
+            'points' for one row per centroid with a match count, default 'rows'
+        match_ids (bool): in 'points' mode, add the comma-separated land
+            index of the matching polygons, default False
+        workers (int): number of worker processes for a LandIndex, default 1
+        executor (ProcessPoolExecutor): worker pool shared by the run, default None
 
     Returns
     -------
         dict_sjoin (dictionary): GeoDataFrames of 'EPSG:4326' CRS
     """
+    flag = land_flags[filetype]
+
     dict_sjoin = {}
     for fname in dict:
-        df = dict[fname].sjoin(tribal, how=how)
-        
-        # if centroid in tribal polygon, label as 1
-        if filetype == 'tribal':
-            df['Tribal'] = df.index_right.apply(lambda x: 0 if pd.isna(x) else 1) 
-            dict_sjoin[fname] = df
-        elif filetype == 'rural':
-            df['Rural'] = df.index_right.apply(lambda x: 0 if pd.isna(x) else 1) 
-            dict_sjoin[fname] = df
-        elif filetype == 'other':
-            df['Other'] = df.index_right.apply(lambda x: 0 if pd.isna(x) else 1) 
-            dict_sjoin[fname] = df
+        points = dict[fname]
+
+        if join_mode == 'points':
+            point_idx, polygon_idx = match_pairs(points, gdf, workers=workers, executor=executor)
+            count = np.bincount(point_idx, minlength=len(points))
+
+            columns = {flag: (count > 0).astype(int), f'{flag}_n': count}
+            if match_ids:
+                land_index = gdf.attributes.index if isinstance(gdf, LandIndex) else gdf.index
+                order = np.lexsort((polygon_idx, point_idx))
+                ids = pd.Series(land_index[polygon_idx[order]].astype(str), index=point_idx[order])
+                ids = ids.groupby(level=0).agg(','.join)
+                columns[f'{flag}_ids'] = ids.reindex(np.arange(len(points))).values
+
+            dict_sjoin[fname] = points.assign(**columns)
+            continue
+
+        if isinstance(gdf, LandIndex):
+            df = gdf.sjoin(points, how=how, workers=workers, executor=executor)
+        else:
+            # reproject the points to the land CRS instead of the land polygons,
+            # joining on positions so duplicate index labels stay apart
+            first, inverse = dedup_points(np.asarray(points.geometry.values))
+            if first is None:
+                df = to_crs(points.reset_index(drop=True), gdf.crs).sjoin(gdf, how=how)
+                df[df.geometry.name] = points.geometry.values[df.index]
+                df.index = points.index[df.index]
+            else:
+                # join each distinct coordinate once, then copy its rows to every centroid
+                distinct = points[[points.geometry.name]].iloc[first].reset_index(drop=True)
+                df = to_crs(distinct, gdf.crs).sjoin(gdf, how=how)
+                point_idx, row_idx = broadcast(inverse, df.index.to_numpy())
+
+                # suffix overlapping column names like GeoDataFrame.sjoin
+                right = pd.DataFrame(df.drop(columns=df.geometry.name)).iloc[row_idx]
+                overlap = set(points.columns) & set(right.columns)
+                left = points.iloc[point_idx].rename(columns={col: f'{col}_left' for col in overlap})
+                right = right.rename(columns={col: f'{col}_right' for col in overlap})
+                right.index = left.index
+                df = pd.concat([left, right], axis=1)
+
+        # if centroid in a land polygon, label as 1
+        df[flag] = df.index_right.notna().astype(int)
+        dict_sjoin[fname] = df
 
     return dict_sjoin    
 
-def save_shp(dict, save_dir):
+def parse_layer(spec):
+    """
+    Parse a land layer specification 'name=path[:col1,col2,...]'
+
+    Parameters
+    ----------
+        spec (str): from args.enrich
+
+    Returns
+    -------
+        name (str): name of the land layer, e.g., 'tribal' or 'county'
+        path (str): land geoshape file or directory of geoshape files
+        columns (list): land attributes to keep, empty for the flag only
+    """
+    name, _, path = spec.partition('=')
+    path, _, columns = path.partition(':')
+
+    return name, path, [col for col in columns.split(',') if col]
+
+def load_layers(specs, index_dir=None, max_vertices=None, mask=None):
+    """
+    Load the prepared index of each land layer
+
+    Parameters
+    ----------
+        specs (list): land layer specifications 'name=path[:col1,col2,...]'
+        index_dir (str): directory to cache the indexes, one per layer, default None
+        max_vertices (int): subdivide land polygons into quadtree cells of at
+            most max_vertices vertices, default None does not subdivide
+        mask (GeoSeries): keep only the land features intersecting mask, default None
+
+    Returns
+    -------
+        layers (list): (name, LandIndex, columns) of each land layer
+    """
+    layers = []
+    for spec in specs:
+        name, path, columns = parse_layer(spec)
+        files = list_shp(path) if os.path.isdir(path) else [path]
+        layer_dir = None if index_dir is None else os.path.join(index_dir, name)
+        index = build_land_index(files, layer_dir, max_vertices=max_vertices, mask=mask)
+        layers.append((name, index, columns))
+
+    return layers
+
+def enrich(dict, layers, predicate='intersects', workers=1, executor=None):
+    """
+    Enrich centroids with the flags and attributes of several land layers in
+        one pass, one row per centroid. A centroid in overlapping polygons
+        takes the attributes of the first polygon in layer order.
+
+    Parameters
+    ----------
+        dict (dictionary): of GeoDataFrames
+        layers (list): (name, LandIndex, columns) of each land layer
+        predicate (str): shapely binary predicate, default 'intersects'
+        workers (int): number of worker processes, default 1
+        executor (ProcessPoolExecutor): worker pool shared by the run, default None
+
+    Returns
+    -------
+        dict_enriched (dictionary): GeoDataFrames with a 0/1 '<Name>' flag and
+            '<name>_<column>' attributes per land layer
+    """
+    dict_enriched = {}
+    for fname in dict:
+        points = dict[fname]
+
+        # query each distinct coordinate once for all layers
+        first, inverse = dedup_points(np.asarray(points.geometry.values))
+        distinct = points.geometry if first is None else points.geometry.iloc[first]
+
+        columns = {}
+        for name, index, cols in layers:
+            polygon_idx = index.first_match(distinct, predicate, workers, dedup=False, executor=executor)
+            if first is not None:
+                polygon_idx = polygon_idx[inverse]
+            columns[name.title()] = (polygon_idx >= 0).astype(int)
+
+            attributes = index.attributes_at(polygon_idx, cols)
+            for col in cols:
+                columns[f'{name}_{col}'] = attributes[col].values
+
+        # add every layer's columns with a single copy of the frame
+        dict_enriched[fname] = points.assign(**columns)
+
+    return dict_enriched
+
+def list_shp(path):
+    """
+    List the geoshape files under a directory
+
+    Parameters
+    ----------
+        path (str): directory of geoshape files
+
+    Returns
+    -------
+        shp_files (list): paths of .shp files
+    """
+    return [
+        os.path.join(root, name)
+        for root, dirs, files in os.walk(path)
+        for name in files
+        if name.endswith((".shp"))
+    ]
+
+def save_shp(dict, save_dir, geometry='source_centroid', mode='w'):
     """
     Save each GeoDataFrame to individual geoshape files
          
@@ -82,14 +421,16 @@ def save_shp(dict, save_dir):
     ----------
         dict (dictionary): GeoDataFrames of 'EPSG:4326' CRS with extracted centroids
         save_dir (str): path of desired output directory
+        geometry (str): name of the geometry column to write, None keeps the active one
+        mode (str): 'w' to write or 'a' to append to existing geoshape files
     """
     for fname in dict:
-        shp_file = dict[fname].set_geometry('source_centroid')
+        shp_file = dict[fname] if geometry is None else dict[fname].set_geometry(geometry)
         
         save_path = os.path.join(save_dir, f"{fname}")
         create_dir(save_path)
         
-        shp_file.to_file(save_path, driver='ESRI Shapefile')
+        shp_file.to_file(os.path.join(save_path, f"{fname}.shp"), driver='ESRI Shapefile', mode=mode)
 
 def create_dir(save_dir):
     """
@@ -102,44 +443,127 @@ def create_dir(save_dir):
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
-def summary_sjoin(dict_sjoin, output_dir):
+def summary_sjoin(dict_sjoin, output_dir, flags=None, summary=None):
     """
-    Print summary statistics of dict_sjoin
+    Print summary statistics of dict_sjoin, writing summary.csv with the counts
+        per dataset and summary_breakdown.csv with the counts per dataset,
+        Place_type and state
 
     Parameters
     ----------
         dict_sjoin (dictionary): of spatial join GeoDataFrames
         output_dir (str): path to save summary_df csv file
+        flags (list): flag columns to count, default the Tribal, Rural and Other flags
+        summary (JoinSummary): running counts, e.g., from stream_join, default None
+            counts dict_sjoin
 
     Returns
     -------
         summary_df (DataFrame): total counts spatial join results
     """
-    summary_gdf = []
-    for fname in dict_sjoin:
-        # print(k, dict_sjoin[k].groupby('Tribal')['Full_Addre'].count())
-        tmp = {}
-        
-        if 'Tribal' in dict_sjoin[fname].columns:
-            tmp['Dataset'] = fname
-            tmp['not_tribal'] = dict_sjoin[fname].Tribal.value_counts().tolist()[0]
-            tmp['tribal'] = dict_sjoin[fname].shape[0] - dict_sjoin[fname].Tribal.value_counts().tolist()[0]
-            summary_gdf.append(tmp)
-        elif 'Rural' in dict_sjoin[fname].columns:
-            tmp['Dataset'] = fname
-            tmp['not_rural'] = dict_sjoin[fname].Rural.value_counts().tolist()[0]
-            tmp['rural'] = dict_sjoin[fname].shape[0] - dict_sjoin[fname].Rural.value_counts().tolist()[0]
-            summary_gdf.append(tmp)
-        elif 'Other' in dict_sjoin[fname].columns:
-            tmp['Dataset'] = fname
-            tmp['not_rural'] = dict_sjoin[fname].Other.value_counts().tolist()[0]
-            tmp['rural'] = dict_sjoin[fname].shape[0] - dict_sjoin[fname].Other.value_counts().tolist()[0]
-            summary_gdf.append(tmp)
-            
-    summary_df = pd.DataFrame(summary_gdf)
-    summary_df.to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
-
-    return summary_df
+    if summary is None:
+        summary = JoinSummary(list(land_flags.values()) if flags is None else flags)
+        for fname in dict_sjoin:
+            summary.update(fname, dict_sjoin[fname])
+
+    return summary.write(output_dir)
+
+def stream_join(data_dir, save_dir, join, batch_size=100000, rows=None, output_format='shp', flags=None):
+    """
+    Spatial join centroids batch by batch, writing each joined batch straight
+        to the output and keeping running summary counts, so memory depends
+        on the land layers and batch size rather than the number of centroids.
+        The summary files are rewritten after every batch to monitor the join.
+
+    Parameters
+    ----------
+        data_dir (str): path of geoshape files or GeoParquet dataset
+        save_dir (str): path of desired output directory
+        join (function): joins a dictionary of GeoDataFrames, e.g., spatial_join or enrich
+        batch_size (int): number of centroids per batch
+        rows (int): number of rows per dataset to read, default None reads all rows
+        output_format (str): 'shp' or 'parquet'
+        flags (list): flag columns to count, default the Tribal, Rural and Other flags
+
+    Returns
+    -------
+        summary (JoinSummary): flag counts by dataset, Place_type and state
+    """
+    parts = {}
+    summary = JoinSummary(list(land_flags.values()) if flags is None else flags)
+    for fname, df in iter_centroids(data_dir, batch_size, rows):
+        with metrics.stage('reproject', rows_in=len(df)):
+            batch = convert_EPSG4326({fname: df})
+
+        with metrics.stage('spatial_join', rows_in=len(df)) as m:
+            batch_sjoin = join(batch)
+            m['rows_out'] = len(batch_sjoin[fname])
+
+        # the first batch of a dataset creates its output, later batches append
+        part = parts.get(fname, 0)
+        with metrics.stage('save', rows_in=len(df)):
+            if output_format == 'parquet':
+                save_parquet(batch_sjoin, os.path.join(save_dir, 'sjoin.parquet'), geometry=None, part=part)
+            else:
+                save_shp(batch_sjoin, save_dir, geometry=None, mode='w' if part == 0 else 'a')
+        parts[fname] = part + 1
+
+        with metrics.stage('summary_sjoin'):
+            summary.update(fname, batch_sjoin[fname])
+            summary.write(save_dir)
+
+    return summary
+
+def report_dedup():
+    """
+    Print how many distinct coordinates were joined for how many centroids
+    """
+    dedup = metrics.stages.get('dedup')
+    if dedup is not None and dedup['rows_in']:
+        ratio = dedup['rows_out'] / dedup['rows_in']
+        print(f"Joined {dedup['rows_out']} distinct coordinates of {dedup['rows_in']} centroids (dedup ratio {ratio:.3f})")
+
+def land_join(args, mask=None, executor=None):
+    """
+    Load the land layers of a CLI run and build its join function
+
+    Parameters
+    ----------
+        args (Namespace): parsed arguments
+        mask (GeoSeries): keep only the land features intersecting mask, default None
+        executor (ProcessPoolExecutor): worker pool shared by every join of the run, default None
+
+    Returns
+    -------
+        join (function): joins a dictionary of GeoDataFrames
+        flags (list): flag columns of the join, None for the land type flags
+    """
+    max_vertices = args.subdivide if args.subdivide > 0 else None
+    with metrics.stage('read_geoshape') as m:
+        if args.enrich is not None:
+            layers = load_layers(args.enrich, args.index_dir, max_vertices, mask)
+            m['rows_out'] = sum(len(index) for name, index, columns in layers)
+        else:
+            files = list_shp(args.geoshape)
+            if args.index_dir is not None or max_vertices is not None or args.workers > 1:
+                # prepared index, rebuilt only when the land geoshape files change
+                geoshape_gdf = build_land_index(files, args.index_dir, max_vertices=max_vertices, mask=mask)
+            else:
+                geoshape_gdf = read_land(files, mask)
+            m['rows_out'] = len(geoshape_gdf)
+
+    if args.enrich is not None:
+        flags = [name.title() for name, index, columns in layers]
+        join = lambda dict: enrich(dict, layers, workers=args.workers, executor=executor)
+    else:
+        flags = None
+        join = lambda dict: spatial_join(
+            dict, geoshape_gdf, args.filetype,
+            join_mode=args.join_mode, match_ids=args.match_ids, workers=args.workers,
+            executor=executor
+        )
+
+    return join, flags
 
 def main():
     parser = argparse.ArgumentParser(
@@ -147,56 +571,139 @@ def main():
     )
 
     # args
-    parser.add_argument("data_dir", required=True, help="path of geoshape files")
+    parser.add_argument("--data_dir", required=True, help="path of geoshape files or GeoParquet dataset")
+    parser.add_argument(
+        "--output_dir", required=True, help="path to save spatial joined geoshape files"
+    )
+    parser.add_argument(
+        "--rows", type=int, default=100, help="Number of rows to count per geoshape file, 0 reads all rows"
+    )
+    parser.add_argument(
+        "--geoshape", help="path to land geoshapes file"
+    )
+    parser.add_argument(
+        "--filetype", help="land type of geoshape file", choices=['tribal', 'rural', 'other']
+    )
+    parser.add_argument(
+        "--join_mode", default="rows", choices=["rows", "points"],
+        help="rows for one row per matching land polygon, points for one row per centroid with a match count"
+    )
+    parser.add_argument(
+        "--match_ids", action="store_true",
+        help="with --join_mode points, add the index of every matching land polygon"
+    )
     parser.add_argument(
-        "output_dir", required=True, help="path to save spatial joined geoshape files"
+        "--enrich", action="append", default=None, metavar="NAME=PATH[:COLUMNS]",
+        help="land layer to enrich centroids with in one pass, repeatable, e.g., county=tl_county.shp:GEOID,NAME"
     )
     parser.add_argument(
-        "rows", default=100, help="Number of rows to count per geoshape file"
+        "--output_format", default="shp", choices=["shp", "parquet"],
+        help="shp for geoshape files or parquet for a GeoParquet dataset partitioned by Place_type"
+    )
+
+    parser.add_argument(
+        "--index_dir", default=None,
+        help="path to cache a prepared spatial index of the land geoshapes for later runs"
+    )
+    parser.add_argument(
+        "--batch_size", type=int, default=0,
+        help="Number of centroids per batch to stream through the join, 0 joins all centroids at once"
+    )
+    parser.add_argument(
+        "--subdivide", type=int, default=0,
+        help="Split land polygons into quadtree cells of at most this many vertices, 0 tests whole polygons"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Number of worker processes, each joining one spatial partition of the centroids"
     )
     parser.add_argument(
-        "geoshape", required=True, help="path to land geoshapes file"
+        "--extent_cell_size", type=float, default=1.0,
+        help="Read only the land features within the grid cells of this size (degrees) around the centroids, 0 reads all features"
     )
     parser.add_argument(
-        "filetype", required=True, help="land type of geoshape file", choices=['tribal', 'rural', 'other']
+        "--extent_col", default=None,
+        help="column to group the centroids by (e.g., state) for one bounding box per group instead of grid cells"
     )
+    add_metrics_args(parser)
 
     args = parser.parse_args()
+    if args.enrich is None and (args.geoshape is None or args.filetype is None):
+        parser.error("--geoshape and --filetype are required without --enrich")
+    start_metrics(parser, args)
 
-    HIFLD_path = args.data_dir
-    shp_files = [
-        os.path.join(root, name)
-        for root, dirs, files in os.walk(HIFLD_path)
-        for name in files
-        if name.endswith((".shp"))
-    ]
-    geoshape_file = [
-        os.path.join(root, name)
-        for root, dirs, files in os.walk(args.geoshape)
-        for name in files
-        if name.endswith((".shp"))
-    ]
-    geoshape_gdf = gpd.read_file(geoshape_file)
+    # one worker pool for every batch and land layer of the run
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        HIFLD_path = args.data_dir
+        shp_files = list_shp(HIFLD_path)
+        save_dir = args.output_dir
+        create_dir(save_dir)
+        rows = args.rows if args.rows > 0 else None
+
+        if args.batch_size > 0:
+            # the extent of the centroid files is known from their headers
+            mask = file_extent(HIFLD_path) if args.extent_cell_size > 0 else None
+            join, flags = land_join(args, mask, executor)
+
+            summary = stream_join(
+                HIFLD_path, save_dir, join, args.batch_size, rows, args.output_format, flags
+            )
+            summary_df = summary_sjoin({}, save_dir, flags, summary)
+            print(summary_df.to_string())
+            report_dedup()
+
+            if args.metrics is not None:
+                metrics.write(args.metrics, args.metrics_format, program='spatial_join')
+            return
+
+        centroids_dict = dict()
+        with metrics.stage('read_centroids') as m:
+            if HIFLD_path.endswith('.parquet'):
+                # GeoParquet centroid dataset from calculate_centroid.py
+                gdf = read_parquet(HIFLD_path)
+                for fname, df in gdf.groupby('Place_type', observed=True, sort=False):
+                    centroids_dict[str(fname)] = df if rows is None else df.head(rows)
+
+            for file in shp_files:
+                basename = os.path.basename(file).split('/')[0]
+                fname = os.path.basename(basename).split('.')[0]
+
+                # print(file)
+                df = read_shp(file, rows=rows)
+                centroids_dict[fname] = df
+
+            n_rows = sum(len(centroids_dict[fname]) for fname in centroids_dict)
+            m['rows_out'] = n_rows
 
-    centroids_dict = dict()
-    for file in shp_files:
-        basename = os.path.basename(file).split('/')[0]
-        fname = os.path.basename(basename).split('.')[0]
+        with metrics.stage('reproject', rows_in=n_rows):
+            dict_EPSG4326 = convert_EPSG4326(centroids_dict)
 
-        # print(file)
-        df = read_shp(file, rows=args.rows)
-        centroids_dict[fname] = df
+        mask = None
+        if args.extent_cell_size > 0:
+            mask = point_extent(dict_EPSG4326, args.extent_cell_size, args.extent_col)
+        join, flags = land_join(args, mask, executor)
 
-    dict_EPSG4326 = convert_EPSG4326(centroids_dict)
-    geoshapes_4326 = geoshape_gdf.to_crs("EPSG:4326")
+        with metrics.stage('spatial_join', rows_in=n_rows) as m:
+            dict_sjoin = join(dict_EPSG4326)
+            m['rows_out'] = sum(len(dict_sjoin[fname]) for fname in dict_sjoin)
 
-    dict_sjoin = spatial_join(dict_EPSG4326, geoshapes_4326, args.filetype)
+        with metrics.stage('save', rows_in=n_rows):
+            if args.output_format == 'parquet':
+                save_parquet(dict_sjoin, os.path.join(save_dir, 'sjoin.parquet'), geometry=None)
+            else:
+                save_shp(dict_sjoin, save_dir, geometry=None)
 
-    save_dir = args.output_dir
-    create_dir(save_dir)
+        with metrics.stage('summary_sjoin'):
+            summary_df = summary_sjoin(dict_sjoin, save_dir, flags)
+        print(summary_df.to_string())
+        report_dedup()
 
-    summary_df = summary_sjoin(dict_sjoin, save_dir)
-    print(summary_df.to_string())
+        if args.metrics is not None:
+            metrics.write(args.metrics, args.metrics_format, program='spatial_join')
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
 if __name__ == "__main__":
     main()
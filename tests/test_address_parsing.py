@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from address_parsing import (
+    Pub28_usaddress_template,
+    usaddress_parse,
+    custom_flag,
+    custom_parser,
+    flag_rules,
+    normalize_state,
+    multipleReplace,
+    us_state_to_abbrev,
+)
+from parse_cache import ParseCache, normalize_address
+
+
+def parsed_address(**components):
+    """
+    A successfully parsed address with some components replaced
+    """
+    row = {
+        "address_1": "123 Main St",
+        "address_2": np.nan,
+        "city": "Seattle",
+        "state": "WA",
+        "state_abbr": "WA",
+        "zip": "98101",
+    }
+    row.update(components)
+    return row
+
+
+def test_custom_flag_rules():
+    df = pd.DataFrame(
+        [
+            parsed_address(),
+            parsed_address(address_1="PO Box 12"),
+            parsed_address(address_2="PMB 4"),
+            parsed_address(address_1="Apt 4 123 Main St"),
+            parsed_address(address_1="Main St"),
+            parsed_address(address_1="123 Main St #4"),
+            parsed_address(state="Washington", state_abbr="Washington"),
+            parsed_address(state_abbr=np.nan),
+            parsed_address(zip=np.nan),
+            parsed_address(address_1="Suite 5 Main St", city=np.nan),
+        ]
+    )
+    flag, flag_bits, rule_counts = custom_flag(df)
+
+    messages = {name: message for name, message, _ in flag_rules}
+    assert flag.tolist() == [
+        "SUCCESSFUL ADDRESS",
+        messages["po_box"],
+        messages["po_box"],
+        messages["flipped"],
+        messages["leading_letter"],
+        messages["special_characters"],
+        messages["state_format"],
+        messages["state_format"],
+        messages["incomplete"],
+        messages["flipped"],
+    ]
+
+    bit = {name: 1 << i for i, (name, _, _) in enumerate(flag_rules)}
+    assert flag_bits.tolist() == [
+        0,
+        bit["po_box"] | bit["leading_letter"],
+        bit["po_box"],
+        bit["flipped"] | bit["leading_letter"],
+        bit["leading_letter"],
+        bit["special_characters"],
+        bit["state_format"],
+        bit["state_format"],
+        bit["incomplete"],
+        bit["flipped"] | bit["leading_letter"] | bit["incomplete"],
+    ]
+
+    counts = rule_counts.set_index("rule")
+    assert counts["failed"].to_dict() == {
+        "po_box": 2,
+        "flipped": 2,
+        "leading_letter": 4,
+        "special_characters": 1,
+        "state_format": 2,
+        "incomplete": 2,
+    }
+    assert counts["flagged"].to_dict() == {
+        "po_box": 2,
+        "flipped": 2,
+        "leading_letter": 1,
+        "special_characters": 1,
+        "state_format": 2,
+        "incomplete": 1,
+    }
+
+
+def test_normalize_state():
+    states = pd.Series(
+        ["West Virginia", "Arkansas", "Kansas", "N.J.", "wa", " Washington ", "new  york", "Seattle", np.nan]
+    )
+
+    assert normalize_state(states).tolist()[:8] == ["WV", "AR", "KS", "NJ", "WA", "WA", "NY", "Seattle"]
+    assert pd.isna(normalize_state(states).iloc[8])
+    assert multipleReplace("West Virginia") == "WV"
+
+    abbrev_to_us_state = {abbr: name for name, abbr in us_state_to_abbrev.items()}
+    assert normalize_state(pd.Series(["WV", "ar"]), abbrev_to_us_state).tolist() == ["West Virginia", "Arkansas"]
+
+
+def test_custom_parser():
+    addresses = pd.DataFrame(
+        {
+            "location_source_value": [
+                "123 Main St APT 4, Seattle, WA 98101",
+                "1 Baptist Rd Suite 200, Tacoma, Washington 98402-1234",
+                "5 Elm St Unit B, Newark, N.J. 07102",
+                "9 Oak Ave, Charleston, West Virginia",
+                "7 Pine Ln, Little Rock, AR",
+                "4 Birch Ct, Spokane, Extra, WA 99201",
+                "no commas here",
+            ]
+        }
+    )
+    df = custom_parser(addresses, "location_source_value")
+    df = df[["address_1", "address_2", "city", "state", "zip"]].astype(object).where(df.notna(), None)
+
+    assert df.values.tolist() == [
+        ["123 Main St", "APT 4", "Seattle", "WA", "98101"],
+        ["1 Baptist Rd", "Suite 200", "Tacoma", "Washington", "98402-1234"],
+        ["5 Elm St", "Unit B", "Newark", "N.J.", "07102"],
+        ["9 Oak Ave", None, "Charleston", "West Virginia", None],
+        ["7 Pine Ln", None, "Little Rock", "AR", None],
+        ["4 Birch Ct", None, "Spokane", "WA", "99201"],
+        [None, None, None, None, None],
+    ]
+
+
+def test_parse_cache(tmp_path):
+    path = str(tmp_path / "parse_cache.sqlite")
+    addresses = pd.DataFrame(
+        {"location_source_value": ["123 Main St, Seattle, WA 98101", "9 Oak Ave, Tacoma, WA 98402"]}
+    )
+    parsed = usaddress_parse(addresses.copy())
+
+    cache = ParseCache(path, Pub28_usaddress_template)
+    assert usaddress_parse(addresses.copy(), cache=cache).equals(parsed)
+    assert cache.stats == {"memory_hits": 0, "disk_hits": 0, "misses": 2}
+
+    # formatting variants share the cached result, served from memory
+    variant = pd.DataFrame({"location_source_value": ["123  main st ,Seattle, wa 98101"]})
+    assert normalize_address(variant.location_source_value[0]) == normalize_address(addresses.location_source_value[0])
+    assert usaddress_parse(variant, cache=cache).city.tolist() == ["Seattle"]
+    assert cache.stats == {"memory_hits": 1, "disk_hits": 0, "misses": 2}
+    cache.close()
+
+    # a new process reads the results from disk
+    cache = ParseCache(path, Pub28_usaddress_template)
+    assert usaddress_parse(addresses.copy(), cache=cache).equals(parsed)
+    assert cache.stats == {"memory_hits": 0, "disk_hits": 2, "misses": 0}
+    cache.close()
+
+    # a different tag template invalidates the cached results
+    template = {**Pub28_usaddress_template, "PlaceName": "address2"}
+    cache = ParseCache(path, template)
+    assert cache.get_many([normalize_address(address) for address in addresses.location_source_value]) == {}
+    assert cache.stats == {"memory_hits": 0, "disk_hits": 0, "misses": 2}
+    cache.close()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pandas as pd
+import geopandas as gpd
+import pytest
+
+import calculate_centroid
+from benchmark import write_synthetic_data, hifld_layers
+
+
+def run_centroids(monkeypatch, data_dir, output_dir, *args):
+    monkeypatch.setattr(
+        sys, "argv",
+        ["calculate_centroid.py", "--data_dir", data_dir, "--output_dir", output_dir, "--rows", "0", *args],
+    )
+    calculate_centroid.main()
+
+
+def output_files(output_dir):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), output_dir)
+        for root, dirs, files in os.walk(output_dir)
+        for name in files
+    )
+
+
+def test_parallel_output_matches_serial(monkeypatch, tmp_path):
+    hifld_dir, land_file = write_synthetic_data(str(tmp_path), 25)
+    serial_dir, parallel_dir = str(tmp_path / "serial"), str(tmp_path / "parallel")
+
+    run_centroids(monkeypatch, hifld_dir, serial_dir, "--chunksize", "10")
+    run_centroids(monkeypatch, hifld_dir, parallel_dir, "--chunksize", "10", "--workers", "2")
+
+    assert output_files(parallel_dir) == output_files(serial_dir)
+    pd.testing.assert_frame_equal(
+        pd.read_csv(os.path.join(parallel_dir, "centroids_40k.csv")),
+        pd.read_csv(os.path.join(serial_dir, "centroids_40k.csv")),
+    )
+
+
+@pytest.mark.parametrize("args", [[], ["--chunksize", "10"], ["--chunksize", "10", "--workers", "2"]])
+def test_empty_layer(monkeypatch, tmp_path, args):
+    hifld_dir, land_file = write_synthetic_data(str(tmp_path), 25)
+    layer = os.path.join(hifld_dir, "Synthetic_Prison_Boundaries", "Synthetic_Prison_Boundaries.shp")
+    gpd.read_file(layer).iloc[:0].to_file(layer, driver="ESRI Shapefile")
+    output_dir = str(tmp_path / "centroids")
+
+    run_centroids(monkeypatch, hifld_dir, output_dir, *args)
+
+    assert os.path.exists(os.path.join(output_dir, ".cache", "Synthetic_Prison_Boundaries.csv"))
+    df = pd.read_csv(os.path.join(output_dir, "centroids_40k.csv"))
+    assert len(df) == 25 * (len(hifld_layers) - 1)
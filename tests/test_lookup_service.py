@@ -0,0 +1,32 @@
+import json
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from spatial_index import LandIndex
+from lookup_service import LookupService
+
+
+def test_lookup_keeps_attribute_types():
+    land = gpd.GeoDataFrame(
+        {
+            "GEOID": pd.array([53033, 53061], dtype="int64"),
+            "ALAND": [1.5, np.nan],
+            "NAME": ["King", "Snohomish"],
+            "UPDATED": pd.to_datetime(["2020-01-01", "2021-06-30"]),
+        },
+        geometry=[shapely.box(0, 0, 1, 1), shapely.box(2, 0, 3, 1)],
+        crs="EPSG:4326",
+    )
+    service = LookupService([("tract", LandIndex.from_gdf(land), ["GEOID", "ALAND", "NAME", "UPDATED"])])
+
+    result = json.loads(json.dumps(service.lookup(np.array([0.5, 2.5, 5.0]), np.array([0.5, 0.5, 0.5]))))
+
+    assert result["Tract"] == [1, 1, 0]
+    assert result["tract_GEOID"] == [53033, 53061, None]
+    assert all(isinstance(v, int) for v in result["tract_GEOID"][:2])
+    assert result["tract_ALAND"] == [1.5, None, None]
+    assert result["tract_NAME"] == ["King", "Snohomish", None]
+    assert result["tract_UPDATED"] == ["2020-01-01T00:00:00", "2021-06-30T00:00:00", None]
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import pytest
+
+import spatial_index
+from spatial_index import LandIndex, build_land_index, unique_points, broadcast
+from spatial_join import spatial_join
+
+
+@pytest.fixture
+def land():
+    """
+    Squares sharing edges, a polygon with a hole, an overlapping vertex-heavy
+        circle and a multipolygon
+    """
+    squares = [shapely.box(x, y, x + 1, y + 1) for x in range(3) for y in range(2)]
+    holed = shapely.Polygon(
+        [(4, 0), (7, 0), (7, 3), (4, 3)], holes=[[(5, 1), (6, 1), (6, 2), (5, 2)]]
+    )
+    circle = shapely.Point(2, 1).buffer(1.3, quad_segs=64)
+    multi = shapely.MultiPolygon([shapely.box(0, 3, 1, 4), shapely.box(2, 3, 3, 4)])
+
+    return gpd.GeoDataFrame(
+        {"NAME": [f"land{i}" for i in range(9)]},
+        geometry=squares + [holed, circle, multi],
+        crs="EPSG:4326",
+    )
+
+
+@pytest.fixture
+def points(land):
+    """
+    Random points, points on shared edges, vertices and hole boundaries,
+        points in the hole, and duplicates of all of them
+    """
+    rng = np.random.default_rng(0)
+    xy = rng.uniform([-0.5, -0.5], [7.5, 4.5], size=(2000, 2))
+    # snap half of the points to a 0.5 grid so they fall on edges and vertices
+    xy[::2] = np.round(xy[::2] * 2) / 2
+    edges = np.array([[1, 0.5], [1, 1], [2, 1], [5, 1.5], [5.5, 1], [5.5, 1.5], [4, 3], [0, 3.5]])
+    xy = np.vstack([xy, edges])
+    xy = np.vstack([xy, xy[rng.integers(0, len(xy), 500)]])
+
+    return gpd.GeoSeries(shapely.points(xy), crs="EPSG:4326")
+
+
+def sjoin_pairs(points, land):
+    """
+    (point position, polygon position) pairs of geopandas sjoin
+    """
+    df = gpd.GeoDataFrame(geometry=points.reset_index(drop=True)).sjoin(
+        land.reset_index(drop=True), how="inner", predicate="intersects"
+    )
+    return sorted(zip(df.index, df.index_right))
+
+
+def index_pairs(index, points, **kwargs):
+    point_idx, polygon_idx = index.query(points, **kwargs)
+    return sorted(zip(point_idx.tolist(), polygon_idx.tolist()))
+
+
+@pytest.mark.parametrize("max_vertices", [None, 16])
+@pytest.mark.parametrize("dedup", [True, False])
+def test_query_matches_sjoin(land, points, max_vertices, dedup):
+    index = LandIndex.from_gdf(land, max_vertices=max_vertices)
+    if max_vertices is not None:
+        assert index.cells is not None
+
+    assert index_pairs(index, points, dedup=dedup) == sjoin_pairs(points, land)
+
+
+@pytest.mark.parametrize("max_vertices", [None, 16])
+def test_parallel_query_matches_sjoin(land, points, max_vertices, monkeypatch):
+    monkeypatch.setattr(spatial_index, "min_partition_size", 100)
+    index = LandIndex.from_gdf(land, max_vertices=max_vertices)
+
+    assert index_pairs(index, points, workers=2) == sjoin_pairs(points, land)
+
+
+def test_saved_index_matches_sjoin(land, points, tmp_path):
+    land_file = str(tmp_path / "land.shp")
+    land.to_file(land_file)
+    index_dir = str(tmp_path / "index")
+
+    build_land_index([land_file], index_dir, max_vertices=16)
+    index = build_land_index([land_file], index_dir, max_vertices=16)
+
+    assert index_pairs(index, points) == sjoin_pairs(points, gpd.read_file(land_file))
+
+
+def test_unique_points_broadcast():
+    points = shapely.points([[0, 0], [1, 1], [0, 0], [2, 2], [1, 1]])
+    first, inverse = unique_points(points)
+
+    assert shapely.equals(points[first][inverse], points).all()
+
+    # rows 0 and 1 of the distinct points matched, row 1 twice
+    point_idx, row_idx = broadcast(inverse, np.array([inverse[0], inverse[1], inverse[1]]))
+    assert sorted(zip(point_idx.tolist(), row_idx.tolist())) == [(0, 0), (1, 1), (1, 2), (2, 0), (4, 1), (4, 2)]
+
+
+@pytest.mark.parametrize("as_index", [False, True])
+def test_spatial_join_non_unique_index(land, points, as_index):
+    centroids = gpd.GeoDataFrame(
+        {"Place_type": "Hosp"}, geometry=points.values, crs="EPSG:4326",
+        index=np.arange(len(points)) // 3,
+    )
+    gdf = LandIndex.from_gdf(land) if as_index else land
+
+    df = spatial_join({"Hosp": centroids}, gdf, "tribal")["Hosp"]
+    expected = centroids.sjoin(land, how="left", predicate="intersects")
+
+    assert len(df) == len(expected)
+    assert sorted(zip(df.index, df.index_right.fillna(-1))) == sorted(
+        zip(expected.index, expected.index_right.fillna(-1))
+    )
+    assert df["Tribal"].sum() == expected.index_right.notna().sum()
+
+
+def test_null_geometry(land, points, tmp_path):
+    land = pd.concat([land, gpd.GeoDataFrame({"NAME": ["null"]}, geometry=[None], crs=land.crs)])
+    land.index = np.arange(len(land)) * 10
+
+    LandIndex.from_gdf(land, max_vertices=16).save(str(tmp_path / "index"))
+    index = LandIndex.load(str(tmp_path / "index"))
+    assert len(index) == len(land)
+
+    gdf = gpd.GeoDataFrame(geometry=points.values, crs="EPSG:4326")
+    df = index.sjoin(gdf)
+    expected = gdf.sjoin(land, how="left", predicate="intersects")
+
+    assert sorted(zip(df.index, df.index_right.fillna(-1), df.NAME.fillna(""))) == sorted(
+        zip(expected.index, expected.index_right.fillna(-1), expected.NAME.fillna(""))
+    )